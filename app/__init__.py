@@ -10,10 +10,21 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object('app.config.Config')
 
+    # Pula z pomiarem czasu oczekiwania na połączenie (metryki db_pool_*)
+    from app.db_pool import engine_options
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+        app.config["DB_ROLE"]
+    )
+
     db.init_app(app)
     Migrate(app, db)
     mail.init_app(app)
 
+    from app.utils import flush_events
+    app.teardown_appcontext(flush_events)
+
     from app.routes.dashboard import dashboard_bp
     from app.routes.servers import servers_bp
     from app.routes.tasks import tasks_bp
@@ -21,6 +32,9 @@ def create_app():
     from app.routes.logs import logs_bp
     from app.routes.settings import settings_bp
     from app.routes.auth import auth_bp
+    from app.routes.jobs import jobs_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.runs import runs_bp
 
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(servers_bp)
@@ -29,6 +43,9 @@ def create_app():
     app.register_blueprint(logs_bp)
     app.register_blueprint(settings_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(runs_bp)
 
     login_manager = LoginManager(app)
     login_manager.login_view = 'auth.login'
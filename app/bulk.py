@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import current_app
+
+from app.ssh_pool import get_ssh_pool
+from app.utils import get_private_key_for_paramiko
+
+
+def remote_operation(server, command, label, task_id=None):
+    """Opis polecenia zdalnego do wykonania w tle - tylko wartości serializowalne dla Celery."""
+    return {
+        "server_id": server.id,
+        "task_id": task_id,
+        "hostname": server.hostname,
+        "port": server.port,
+        "command": command,
+        "label": label
+    }
+
+
+def _run_operation(operation, private_key, timeout):
+    """Polecenie na jednym hoście - wywoływane w wątku, bez dostępu do bazy.
+
+    timeout ogranicza łączny czas operacji na hoście (połączenie i polecenie).
+    """
+    started = time.monotonic()
+    try:
+        output, error_output, exit_status = get_ssh_pool().exec_command(
+            operation["hostname"],
+            operation["port"],
+            "backup_user",
+            private_key,
+            operation["command"],
+            timeout=timeout,
+            command_timeout=timeout,
+            deadline=started + timeout
+        )
+        error = error_output.decode(errors="replace").strip() if exit_status else None
+    except Exception as e:
+        exit_status, error = -1, str(e) or e.__class__.__name__
+
+    return {
+        **operation,
+        "success": exit_status == 0,
+        "error": error,
+        "duration_ms": int((time.monotonic() - started) * 1000)
+    }
+
+
+def run_remote_operations(operations, progress=None):
+    """Wykonuje polecenia równolegle (pula wątków) z limitem czasu na host.
+
+    progress(done, failed) jest wywoływany w bieżącym wątku po każdym zakończonym poleceniu.
+    """
+    if not operations:
+        return []
+
+    private_key = get_private_key_for_paramiko()
+    timeout = current_app.config.get("BULK_OPERATION_TIMEOUT", 30)
+    workers = min(current_app.config.get("BULK_OPERATION_WORKERS", 16), len(operations))
+
+    results = []
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_operation, operation, private_key, timeout) for operation in operations]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if not result["success"]:
+                failed += 1
+            if progress:
+                progress(len(results), failed)
+
+    return results
@@ -1,7 +1,12 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 from app import create_app
+from app.db import db
 import os
 from celery.schedules import crontab
+from app.concurrency import CONTROL_QUEUE, BACKUP_QUEUE
+from app.config import Config
+from app.utils import remove_rsync_key_dir
 
 
 flask_app = create_app()
@@ -21,6 +26,19 @@ class ContextTask(celery.Task):
 celery.Task = ContextTask
 
 
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    # Procesy potomne prefork nie mogą używać połączeń otwartych przez proces nadrzędny
+    with flask_app.app_context():
+        db.engine.dispose(close=False)
+
+
+@worker_process_shutdown.connect
+def cleanup_rsync_key_dir(**kwargs):
+    # atexit nie działa w procesach potomnych prefork - katalog z kluczem prywatnym zostałby w /dev/shm
+    remove_rsync_key_dir()
+
+
 celery.conf.beat_schedule = {
     "check-scheduled-backups-every-minute": {
         "task": "app.tasks_celery.check_scheduled_backups",
@@ -33,8 +51,26 @@ celery.conf.beat_schedule.update({
         'task': 'app.tasks_celery.cleanup_old_backups',
         'schedule': crontab(hour=3, minute=0),
     },
+    # Zaległe sprawdzenia (np. przy niedziałającym workerze) nie są kumulowane
+    'check-servers-health': {
+        'task': 'app.tasks_celery.check_servers_health',
+        'schedule': float(Config.HEALTH_CHECK_INTERVAL),
+        'options': {'expires': Config.HEALTH_CHECK_INTERVAL},
+    },
+    'scrub-backups': {
+        'task': 'app.tasks_celery.scrub_stored_backups',
+        'schedule': float(Config.SCRUB_INTERVAL),
+        'options': {'expires': Config.SCRUB_INTERVAL},
+    },
 })
 
+# Osobne kolejki: ciężkie kopie zapasowe nie blokują poleceń kontrolnych
+celery.conf.task_default_queue = CONTROL_QUEUE
+celery.conf.task_routes = {
+    'app.tasks_celery.run_backup_task_celery': {'queue': BACKUP_QUEUE},
+}
+celery.conf.worker_prefetch_multiplier = 1
+
 celery.conf.enable_utc = True
 celery.conf.timezone = 'UTC'
 
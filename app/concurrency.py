@@ -0,0 +1,97 @@
+import os
+import time
+
+import redis
+
+
+CONTROL_QUEUE = "control"
+BACKUP_QUEUE = "backups"
+
+GLOBAL_KEY = "backup_slots:global"
+SERVER_KEY = "backup_slots:server:{}"
+
+# Atomowe zajęcie slotu: usunięcie wygasłych wpisów i sprawdzenie obu limitów
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expires = tonumber(ARGV[2])
+local token = ARGV[3]
+local server_limit = tonumber(ARGV[4])
+local global_limit = tonumber(ARGV[5])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+
+if redis.call('ZSCORE', KEYS[1], token) then
+    redis.call('ZADD', KEYS[1], expires, token)
+    redis.call('ZADD', KEYS[2], expires, token)
+    return 1
+end
+
+if server_limit > 0 and redis.call('ZCARD', KEYS[1]) >= server_limit then
+    return 0
+end
+if global_limit > 0 and redis.call('ZCARD', KEYS[2]) >= global_limit then
+    return 0
+end
+
+redis.call('ZADD', KEYS[1], expires, token)
+redis.call('ZADD', KEYS[2], expires, token)
+return 1
+"""
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+            socket_connect_timeout=2,
+            socket_timeout=5
+        )
+    return _client
+
+
+def acquire_backup_slot(server_id, token, server_limit, global_limit, ttl):
+    """Zajmuje slot wykonania kopii dla serwera; zwraca False, gdy limit jest wyczerpany."""
+    now = time.time()
+    client = get_redis()
+    acquired = client.eval(
+        _ACQUIRE_SCRIPT,
+        2,
+        SERVER_KEY.format(server_id),
+        GLOBAL_KEY,
+        now,
+        now + ttl,
+        token,
+        server_limit or 0,
+        global_limit or 0
+    )
+    return bool(acquired)
+
+
+def release_backup_slot(server_id, token):
+    client = get_redis()
+    pipe = client.pipeline()
+    pipe.zrem(SERVER_KEY.format(server_id), token)
+    pipe.zrem(GLOBAL_KEY, token)
+    pipe.execute()
+
+
+def get_occupancy(server_ids, queues):
+    """Bieżące zajęcie slotów per serwer i globalnie oraz długości kolejek Celery."""
+    now = time.time()
+    client = get_redis()
+    pipe = client.pipeline()
+    pipe.zcount(GLOBAL_KEY, now, "+inf")
+    for server_id in server_ids:
+        pipe.zcount(SERVER_KEY.format(server_id), now, "+inf")
+    for queue in queues:
+        pipe.llen(queue)
+    results = pipe.execute()
+
+    running_global = results[0]
+    per_server = dict(zip(server_ids, results[1:1 + len(server_ids)]))
+    per_queue = dict(zip(queues, results[1 + len(server_ids):]))
+    return running_global, per_server, per_queue
@@ -3,6 +3,30 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Rola procesu (zmienna SERVICE z docker-compose) i domyślna pula połączeń z bazą:
+# (pool_size, max_overflow). Worker Celery wykonuje jedno zadanie naraz na proces,
+# ale zapis zdarzeń używa osobnego połączenia; beat nie wykonuje zapytań.
+DB_ROLES = {"web": "web", "celery_worker": "worker", "celery_beat": "beat"}
+DB_POOL_DEFAULTS = {"web": (10, 10), "worker": (2, 2), "beat": (1, 0)}
+
+
+def db_engine_options(role):
+    """Opcje silnika SQLAlchemy dla roli; DB_*_<ROLA> (np. DB_POOL_SIZE_WORKER) ma pierwszeństwo przed DB_*."""
+    def setting(name, default):
+        return int(os.getenv(f"{name}_{role.upper()}", os.getenv(name, default)))
+
+    pool_size, max_overflow = DB_POOL_DEFAULTS[role]
+    return {
+        "pool_size": setting("DB_POOL_SIZE", pool_size),
+        "max_overflow": setting("DB_MAX_OVERFLOW", max_overflow),
+        "pool_timeout": setting("DB_POOL_TIMEOUT", 30),
+        # Połączenia są odnawiane przed upływem wait_timeout MySQL, a pre-ping wykrywa
+        # połączenia zamknięte przez serwer wcześniej (restart, proxy) zamiast zwracać błąd
+        "pool_recycle": setting("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": True,
+    }
+
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev_secret")
     FLASK_DEBUG = os.getenv("FLASK_DEBUG", "0") == "1"
@@ -19,11 +43,78 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    DB_ROLE = DB_ROLES.get(os.getenv("SERVICE", "web"), "web")
+    SQLALCHEMY_ENGINE_OPTIONS = db_engine_options(DB_ROLE)
+
     HOST= os.getenv("HOST", "0.0.0.0")
     PORT= os.getenv("PORT", "8000")
     
     BACKUP_FOLDER = "/root/backup_files"
 
+    # Ponowne liczenie SHA-256 pobranego pliku mimo sumy zgłoszonej przez serwer źródłowy
+    VERIFY_LOCAL_CHECKSUM = os.getenv("VERIFY_LOCAL_CHECKSUM", "False").lower() == "true"
+
+    # Magazyn deduplikacji: katalog fragmentów, klucz AES-256 (base64, 32 bajty) i średni rozmiar fragmentu
+    DEDUP_STORE_FOLDER = os.getenv("DEDUP_STORE_FOLDER", "/root/backup_files/chunks")
+    DEDUP_STORE_KEY = os.getenv("DEDUP_STORE_KEY")
+    DEDUP_CHUNK_AVG_SIZE = int(os.getenv("DEDUP_CHUNK_AVG_SIZE", 1024 * 1024))
+
+    # Weryfikacja integralności kopii: odstęp uruchomień i limit czasu jednego przebiegu (s),
+    # limit odczytu (MB/s), liczba procesów liczących sumy i okres ponownej weryfikacji (dni)
+    SCRUB_INTERVAL = int(os.getenv("SCRUB_INTERVAL", 3600))
+    SCRUB_RUN_SECONDS = int(os.getenv("SCRUB_RUN_SECONDS", 600))
+    SCRUB_MAX_MBPS = int(os.getenv("SCRUB_MAX_MBPS", 50))
+    SCRUB_WORKERS = int(os.getenv("SCRUB_WORKERS", 2))
+    SCRUB_REVERIFY_DAYS = int(os.getenv("SCRUB_REVERIFY_DAYS", 30))
+    SCRUB_USE_PROCESSES = os.getenv("SCRUB_USE_PROCESSES", "True").lower() == "true"
+
+    # Wysyłka plików kopii przez serwer proxy: "" (Flask), "x-accel" (nginx) lub "x-sendfile" (Apache/lighttpd)
+    FILE_DOWNLOAD_OFFLOAD = os.getenv("FILE_DOWNLOAD_OFFLOAD", "").lower()
+    X_ACCEL_LOCATION = os.getenv("X_ACCEL_LOCATION", "/protected-backups/")
+
+    # Czyszczenie starych kopii: rozmiar partii (UPDATE + commit) i liczba wątków usuwających pliki
+    CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", 1000))
+    CLEANUP_UNLINK_WORKERS = int(os.getenv("CLEANUP_UNLINK_WORKERS", 8))
+
+    SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", 5000))
+    SCHEDULER_MISFIRE_GRACE_TIME = int(os.getenv("SCHEDULER_MISFIRE_GRACE_TIME", 0))
+
+    # Globalny limit jednocześnie wykonywanych kopii (0 = bez limitu)
+    BACKUP_GLOBAL_CONCURRENCY = int(os.getenv("BACKUP_GLOBAL_CONCURRENCY", 8))
+    BACKUP_SLOT_TTL = int(os.getenv("BACKUP_SLOT_TTL", 6 * 3600))
+    BACKUP_HOLD_DELAY = int(os.getenv("BACKUP_HOLD_DELAY", 30))
+
+    # Buforowanie zdarzeń: zapis wsadowy po tylu zdarzeniach lub po tylu sekundach
+    EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", 50))
+    EVENT_BUFFER_MAX_AGE = float(os.getenv("EVENT_BUFFER_MAX_AGE", 5))
+    EVENT_LOOKUP_CACHE_TTL = int(os.getenv("EVENT_LOOKUP_CACHE_TTL", 60))
+    # Zdarzenia niezapisane przy niedostępnej bazie (wspólny wolumen - odtwarza je dowolny proces)
+    EVENT_SPOOL_FOLDER = os.getenv("EVENT_SPOOL_FOLDER", "/root/backup_files/event_spool")
+
+    # Token (nagłówek Authorization: Bearer) dla Prometheusa; bez tokenu /metrics wymaga zalogowania
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+    # Czas życia cache statystyk kokpitu w Redis (0 = bez cache)
+    DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", 30))
+
+    SSH_POOL_MAX_PER_HOST = int(os.getenv("SSH_POOL_MAX_PER_HOST", 4))
+    SSH_POOL_IDLE_TIMEOUT = int(os.getenv("SSH_POOL_IDLE_TIMEOUT", 300))
+    SSH_KEEPALIVE_INTERVAL = int(os.getenv("SSH_KEEPALIVE_INTERVAL", 30))
+
+    # Transfery rsync: co ile sekund sprawdzać zmianę klucza w ustawieniach oraz czas
+    # utrzymania współdzielonego połączenia ssh (ControlPersist, 0 = bez współdzielenia)
+    RSYNC_KEY_CACHE_TTL = int(os.getenv("RSYNC_KEY_CACHE_TTL", 60))
+    RSYNC_CONTROL_PERSIST = int(os.getenv("RSYNC_CONTROL_PERSIST", 60))
+
+    # Okresowe, równoległe sprawdzanie dostępności serwerów
+    HEALTH_CHECK_INTERVAL = int(os.getenv("HEALTH_CHECK_INTERVAL", 300))
+    HEALTH_CHECK_TIMEOUT = int(os.getenv("HEALTH_CHECK_TIMEOUT", 5))
+    HEALTH_CHECK_WORKERS = int(os.getenv("HEALTH_CHECK_WORKERS", 32))
+
+    # Operacje zbiorcze w tle (usuwanie serwerów i zadań): liczba wątków i łączny limit czasu na host
+    BULK_OPERATION_WORKERS = int(os.getenv("BULK_OPERATION_WORKERS", 16))
+    BULK_OPERATION_TIMEOUT = int(os.getenv("BULK_OPERATION_TIMEOUT", 30))
+
     DEFAULT_ADMIN_USERNAME = os.getenv('DEFAULT_ADMIN_USERNAME', 'admin')
     DEFAULT_ADMIN_PASSWORD = os.getenv('DEFAULT_ADMIN_PASSWORD', 'admin123')
         
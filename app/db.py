@@ -1,3 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
+
+
+def release_db_connection():
+    """Zwraca połączenie sesji do puli przed długą operacją zdalną (SSH).
+
+    Sesja bez niezapisanych zmian kończy transakcję, więc żądanie czekające
+    na wolny host nie blokuje połączenia potrzebnego innym żądaniom; obiekty
+    zostaną odczytane ponownie przy następnym dostępie.
+    """
+    session = db.session()
+    if session.in_transaction() and not (session.new or session.dirty or session.deleted):
+        session.commit()
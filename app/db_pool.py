@@ -0,0 +1,101 @@
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import DB_POOL_CHECKOUT_SECONDS, DB_POOL_OVERFLOW_CHECKOUTS, DB_POOL_TIMEOUTS
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool mierzący czas oczekiwania na połączenie i użycie połączeń ponad pool_size.
+
+    Wartości trafiają do metryk Prometheus (etykieta role) oraz do statystyk
+    bieżącego procesu zwracanych przez stats(). Rola jest przekazywana do
+    create_engine jako pool_role - SQLAlchemy przekazuje puli argumenty
+    nazwane w jej __init__.
+    """
+
+    # Logger w przestrzeni sqlalchemy.pool zamiast domyślnej app.db_pool - ta dziedziczy
+    # poziom DEBUG loggera Flask (FLASK_DEBUG) i logowałaby każde pobranie połączenia
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.InstrumentedQueuePool"
+
+    def __init__(self, creator, pool_role="web", **kwargs):
+        super().__init__(creator, **kwargs)
+        self.role = pool_role
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "overflow_checkouts": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "peak_checked_out": 0,
+        }
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.role).inc()
+            with self._stats_lock:
+                self._stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.monotonic() - started
+            DB_POOL_CHECKOUT_SECONDS.labels(self.role).observe(waited)
+
+        checked_out = self.checkedout()
+        overflow = checked_out > self.size()
+        if overflow:
+            DB_POOL_OVERFLOW_CHECKOUTS.labels(self.role).inc()
+
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["overflow_checkouts"] += overflow
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+            self._stats["peak_checked_out"] = max(self._stats["peak_checked_out"], checked_out)
+        return conn
+
+    def recreate(self):
+        # engine.dispose() tworzy nową pulę bez argumentów spoza QueuePool
+        pool = super().recreate()
+        pool.role = self.role
+        return pool
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "role": self.role,
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+        })
+        stats["wait_seconds_avg"] = (
+            round(stats["wait_seconds_total"] / stats["checkouts"], 6) if stats["checkouts"] else 0.0
+        )
+        return stats
+
+
+QUEUE_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout")
+
+
+def uses_queue_pool(uri):
+    """SQLite w pamięci działa na StaticPool (ustawianym przez Flask-SQLAlchemy) - bez rozmiaru puli."""
+    url = make_url(uri)
+    if url.get_backend_name() != "sqlite":
+        return True
+    return url.database not in (None, "", ":memory:") and url.query.get("mode") != "memory"
+
+
+def engine_options(uri, options, role):
+    """Opcje silnika dla adresu bazy: pula z pomiarem tylko tam, gdzie silnik używa QueuePool."""
+    if uses_queue_pool(uri):
+        return {"poolclass": InstrumentedQueuePool, "pool_role": role, **options}
+    return {name: value for name, value in options.items() if name not in QUEUE_POOL_OPTIONS}
@@ -0,0 +1,236 @@
+"""Magazyn fragmentów z deduplikacją dla plików kopii zapasowych.
+
+Archiwum zadania z włączoną deduplikacją jest dzielone algorytmem FastCDC
+(granice fragmentów zależne od treści), a każdy fragment trafia do magazynu
+adresowanego skrótem HMAC-SHA256 i jest szyfrowany AES-256-GCM kluczem
+DEDUP_STORE_KEY. Powtarzające się fragmenty kolejnych kopii są zapisywane
+tylko raz; licznik odwołań pozwala zwolnić fragment, gdy nie wskazuje na
+niego już żaden plik.
+
+Deduplikacja wymaga jawnej treści - zaszyfrowane GPG archiwa (losowy klucz
+sesji) nie mają wspólnych fragmentów. Dla takich zadań klient wysyła więc
+archiwum bez GPG (kompresja --rsyncable), a szyfrowanie wykonuje menedżer.
+Kompromis: menedżer widzi jawne dane tych zadań i przechowuje klucz, którym
+da się je odczytać, w zamian za miejsce zajmowane tylko przez zmienione dane.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from fastcdc import fastcdc
+from flask import current_app
+from sqlalchemy import func, update, delete
+
+from app.db import db
+from app.models.dedup_chunk import DedupChunk, BackupFileChunk
+
+
+NONCE_SIZE = 12
+COMMIT_EVERY = 64
+QUERY_BATCH = 500
+
+
+def get_store_key():
+    key = current_app.config.get("DEDUP_STORE_KEY")
+    if not key:
+        raise RuntimeError("Brak klucza magazynu deduplikacji (DEDUP_STORE_KEY).")
+    raw = base64.b64decode(key)
+    if len(raw) != 32:
+        raise RuntimeError("DEDUP_STORE_KEY musi zawierać 32 bajty zakodowane base64.")
+    return raw
+
+
+def chunk_path(chunk_id):
+    name = f"{chunk_id:012d}"
+    return os.path.join(current_app.config["DEDUP_STORE_FOLDER"], name[:6], name[6:9], name)
+
+
+def _reference_chunk(digest):
+    """Zwiększa licznik odwołań istniejącego fragmentu; None, gdy fragmentu nie ma."""
+    row = (
+        db.session.query(DedupChunk.id)
+        .filter(DedupChunk.digest == digest, DedupChunk.refcount > 0)
+        .first()
+    )
+    if row is None:
+        return None
+
+    # Fragment z licznikiem 0 czeka na usunięcie i nie może zostać wskrzeszony
+    result = db.session.execute(
+        update(DedupChunk)
+        .where(DedupChunk.id == row.id, DedupChunk.refcount > 0)
+        .values(refcount=DedupChunk.refcount + 1)
+    )
+    return row.id if result.rowcount else None
+
+
+def _store_chunk(aes, digest, data):
+    chunk = DedupChunk(digest=digest, size=len(data), stored_size=0, refcount=1)
+    db.session.add(chunk)
+    db.session.flush()
+
+    nonce = os.urandom(NONCE_SIZE)
+    payload = nonce + aes.encrypt(nonce, data, digest.encode())
+    chunk.stored_size = len(payload)
+
+    path = chunk_path(chunk.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+    return chunk.id, len(payload)
+
+
+def ingest_backup_file(backup_file):
+    """Przenosi pobrany plik kopii do magazynu fragmentów i usuwa jego jawną kopię.
+
+    Odwołania są zatwierdzane partiami razem z licznikami, więc przy błędzie
+    wystarczy zwolnić fragmenty tego pliku - plik na dysku pozostaje nietknięty.
+    """
+    key = get_store_key()
+    aes = AESGCM(key)
+    avg_size = current_app.config.get("DEDUP_CHUNK_AVG_SIZE", 1024 * 1024)
+
+    started = time.monotonic()
+    logical_bytes = 0
+    stored_bytes = 0
+    refs = []
+
+    try:
+        for seq, chunk in enumerate(fastcdc(
+            backup_file.path,
+            min_size=avg_size // 4,
+            avg_size=avg_size,
+            max_size=avg_size * 4,
+            fat=True
+        )):
+            digest = hmac.new(key, chunk.data, hashlib.sha256).hexdigest()
+
+            chunk_id = _reference_chunk(digest)
+            if chunk_id is None:
+                chunk_id, written = _store_chunk(aes, digest, chunk.data)
+                stored_bytes += written
+
+            refs.append({"backup_file_id": backup_file.id, "seq": seq, "chunk_id": chunk_id})
+            logical_bytes += chunk.length
+
+            if len(refs) >= COMMIT_EVERY:
+                db.session.execute(BackupFileChunk.__table__.insert(), refs)
+                db.session.commit()
+                refs = []
+
+        if refs:
+            db.session.execute(BackupFileChunk.__table__.insert(), refs)
+
+        if logical_bytes != os.path.getsize(backup_file.path):
+            raise RuntimeError(f"Niepełny odczyt pliku {backup_file.name} podczas deduplikacji.")
+
+        elapsed = time.monotonic() - started
+        backup_file.deduplicated = True
+        backup_file.stored_size = stored_bytes
+        backup_file.ingest_ms = int(elapsed * 1000)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        release_file_chunks([backup_file.id])
+        raise
+
+    os.remove(backup_file.path)
+
+    return {
+        "logical_bytes": logical_bytes,
+        "stored_bytes": stored_bytes,
+        "seconds": elapsed
+    }
+
+
+def iter_file_chunks(backup_file):
+    """Strumień odtworzonej treści pliku - fragmenty odszyfrowywane po kolei."""
+    aes = AESGCM(get_store_key())
+    last_seq = -1
+
+    while True:
+        rows = (
+            db.session.query(BackupFileChunk.seq, DedupChunk.id, DedupChunk.digest)
+            .join(DedupChunk, DedupChunk.id == BackupFileChunk.chunk_id)
+            .filter(BackupFileChunk.backup_file_id == backup_file.id, BackupFileChunk.seq > last_seq)
+            .order_by(BackupFileChunk.seq)
+            .limit(QUERY_BATCH)
+            .all()
+        )
+        if not rows:
+            return
+
+        for seq, chunk_id, digest in rows:
+            with open(chunk_path(chunk_id), "rb") as f:
+                payload = f.read()
+            yield aes.decrypt(payload[:NONCE_SIZE], payload[NONCE_SIZE:], digest.encode())
+            last_seq = seq
+
+
+def release_file_chunks(file_ids):
+    """Zmniejsza liczniki fragmentów plików i usuwa fragmenty bez odwołań.
+
+    Zwraca (liczba usuniętych fragmentów, zwolnione bajty).
+    """
+    if not file_ids:
+        return 0, 0
+
+    counts = (
+        db.session.query(BackupFileChunk.chunk_id, func.count(BackupFileChunk.id))
+        .filter(BackupFileChunk.backup_file_id.in_(file_ids))
+        .group_by(BackupFileChunk.chunk_id)
+        .all()
+    )
+
+    by_count = {}
+    for chunk_id, count in counts:
+        by_count.setdefault(count, []).append(chunk_id)
+
+    for count, chunk_ids in by_count.items():
+        for i in range(0, len(chunk_ids), QUERY_BATCH):
+            db.session.execute(
+                update(DedupChunk)
+                .where(DedupChunk.id.in_(chunk_ids[i:i + QUERY_BATCH]))
+                .values(refcount=DedupChunk.refcount - count)
+            )
+
+    db.session.execute(
+        delete(BackupFileChunk).where(BackupFileChunk.backup_file_id.in_(file_ids))
+    )
+    db.session.commit()
+
+    removed = 0
+    freed_bytes = 0
+    affected = [chunk_id for chunk_id, _ in counts]
+
+    for i in range(0, len(affected), QUERY_BATCH):
+        dead = (
+            db.session.query(DedupChunk.id, DedupChunk.stored_size)
+            .filter(DedupChunk.id.in_(affected[i:i + QUERY_BATCH]), DedupChunk.refcount <= 0)
+            .all()
+        )
+        if not dead:
+            continue
+
+        db.session.execute(
+            delete(DedupChunk)
+            .where(DedupChunk.id.in_([row.id for row in dead]), DedupChunk.refcount <= 0)
+        )
+        db.session.commit()
+
+        for chunk_id, stored_size in dead:
+            try:
+                os.remove(chunk_path(chunk_id))
+            except FileNotFoundError:
+                pass
+            removed += 1
+            freed_bytes += stored_size
+
+    return removed, freed_bytes
+
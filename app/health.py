@@ -0,0 +1,94 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import update
+
+from app.db import db, release_db_connection
+from app.models.server import Server
+from app.ssh_pool import get_ssh_pool
+from app.utils import get_private_key_for_paramiko, log_event
+from app.stats import invalidate_dashboard_stats
+
+
+def _check_host(target, private_key, timeout):
+    """Polecenie `check` na jednym hoście - wywoływane w wątku, bez dostępu do bazy.
+
+    timeout ogranicza łączny czas sprawdzenia; przekroczenie (CommandTimeout) oznacza niedostępny host.
+    """
+    server_id, hostname, port = target
+    started = time.monotonic()
+    try:
+        _, error_output, exit_status = get_ssh_pool().exec_command(
+            hostname, port, "backup_user", private_key, "check",
+            timeout=timeout,
+            command_timeout=timeout,
+            deadline=started + timeout
+        )
+        error = error_output.decode(errors="replace").strip() if exit_status else None
+    except Exception as e:
+        exit_status, error = -1, str(e)
+
+    latency_ms = int((time.monotonic() - started) * 1000)
+    return server_id, exit_status == 0, latency_ms, error
+
+
+def check_servers(server_ids=None):
+    """Sprawdza serwery równolegle (pula wątków) i zapisuje status, czas i opóźnienie sprawdzenia.
+
+    Całość trwa mniej więcej tyle, ile sprawdzenie najwolniejszego hosta, ograniczone
+    przez HEALTH_CHECK_TIMEOUT (przy liczbie serwerów nie większej niż HEALTH_CHECK_WORKERS).
+    """
+    query = db.session.query(Server.id, Server.hostname, Server.port, Server.status).filter(Server.deleted == False)
+    if server_ids is not None:
+        query = query.filter(Server.id.in_(server_ids))
+    servers = query.all()
+    if not servers:
+        return []
+
+    previous = {server.id: server.status for server in servers}
+    targets = [(server.id, server.hostname, server.port) for server in servers]
+
+    private_key = get_private_key_for_paramiko()
+    release_db_connection()
+    timeout = current_app.config.get("HEALTH_CHECK_TIMEOUT", 5)
+    workers = min(current_app.config.get("HEALTH_CHECK_WORKERS", 32), len(targets))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda target: _check_host(target, private_key, timeout), targets))
+
+    checked_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.session.execute(update(Server), [
+        {
+            "id": server_id,
+            "status": "aktywny" if success else "nieaktywny",
+            "last_check_at": checked_at,
+            "last_check_latency_ms": latency_ms
+        }
+        for server_id, success, latency_ms, _ in results
+    ])
+    db.session.commit()
+
+    changed = False
+    for server_id, success, _, error in results:
+        if success and previous[server_id] != "aktywny":
+            changed = True
+            log_event("Serwer ponownie dostępny.", type="informacja", server_id=server_id)
+        elif not success and previous[server_id] == "aktywny":
+            changed = True
+            log_event(f"Serwer niedostępny: {error or 'brak odpowiedzi'}", type="błąd", server_id=server_id)
+    if changed:
+        invalidate_dashboard_stats()
+
+    return [
+        {
+            "id": server_id,
+            "success": success,
+            "status": "aktywny" if success else "nieaktywny",
+            "latency_ms": latency_ms,
+            "checked_at": checked_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "error": error
+        }
+        for server_id, success, latency_ms, error in results
+    ]
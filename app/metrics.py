@@ -0,0 +1,108 @@
+"""Metryki Prometheus etapów kopii zapasowej.
+
+Przy ustawionej zmiennej PROMETHEUS_MULTIPROC_DIR każdy proces (workery
+gunicorn i Celery) zapisuje wartości do własnych plików w tym katalogu,
+a /metrics sumuje je ze wszystkich procesów. Katalog może być współdzielony
+przez kontenery - pliki są rozróżniane nazwą hosta i PID.
+"""
+import os
+import socket
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess, values
+)
+
+
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    # PID-y w różnych kontenerach się powtarzają - sam PID nie identyfikuje procesu. Stała nazwa
+    # instancji (zamiast nazwy hosta, zmienianej przy odtworzeniu kontenera) pozwala entrypoint.sh
+    # usunąć pliki poprzedniego uruchomienia, więc katalog nie rośnie bez końca
+    _instance = os.getenv("METRICS_INSTANCE") or socket.gethostname()
+    values.ValueClass = values.MultiProcessValue(process_identifier=lambda: f"{_instance}_{os.getpid()}")
+
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, float("inf"))
+
+BACKUP_RUN_SECONDS = Histogram(
+    "backup_run_duration_seconds",
+    "Czas pojedynczej próby wykonania kopii (zadanie Celery)",
+    ["server", "task", "result"],
+    buckets=DURATION_BUCKETS
+)
+BACKUP_QUEUE_WAIT_SECONDS = Histogram(
+    "backup_queue_wait_seconds",
+    "Czas od zlecenia kopii do rozpoczęcia wykonania (kolejka i limity współbieżności)",
+    ["server", "task"],
+    buckets=DURATION_BUCKETS
+)
+BACKUP_REMOTE_SECONDS = Histogram(
+    "backup_remote_duration_seconds",
+    "Czas tworzenia archiwum na serwerze źródłowym (run_backup.sh)",
+    ["server", "task"],
+    buckets=DURATION_BUCKETS
+)
+BACKUP_ARCHIVE_BYTES = Counter(
+    "backup_archive_bytes",
+    "Rozmiar archiwów utworzonych na serwerach źródłowych",
+    ["server", "task"]
+)
+BACKUP_RETRIES = Counter(
+    "backup_retries",
+    "Ponowienia wykonania kopii",
+    ["server", "task"]
+)
+SSH_COMMAND_SECONDS = Histogram(
+    "ssh_command_duration_seconds",
+    "Czas poleceń SSH wysyłanych do wyzwalacza",
+    ["server", "command", "result"],
+    buckets=DURATION_BUCKETS
+)
+RSYNC_TRANSFER_SECONDS = Histogram(
+    "rsync_transfer_duration_seconds",
+    "Czas pobierania pliku kopii przez rsync",
+    ["server", "task", "result"],
+    buckets=DURATION_BUCKETS
+)
+RSYNC_TRANSFERRED_BYTES = Counter(
+    "rsync_transferred_bytes",
+    "Bajty pobrane przez rsync",
+    ["server", "task"]
+)
+CHECKSUM_SECONDS = Histogram(
+    "backup_checksum_duration_seconds",
+    "Czas liczenia SHA-256 pobranego pliku",
+    ["task"],
+    buckets=DURATION_BUCKETS
+)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, float("inf"))
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Czas oczekiwania na połączenie z puli bazy danych",
+    ["role"],
+    buckets=WAIT_BUCKETS
+)
+DB_POOL_OVERFLOW_CHECKOUTS = Counter(
+    "db_pool_overflow_checkouts",
+    "Pobrania połączenia, gdy w użyciu było więcej połączeń niż pool_size",
+    ["role"]
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts",
+    "Przekroczenia DB_POOL_TIMEOUT przy oczekiwaniu na połączenie",
+    ["role"]
+)
+EVENTS_LOGGED = Counter(
+    "events_logged",
+    "Zdarzenia zapisane w dzienniku",
+    ["type"]
+)
+
+
+def generate_metrics():
+    """Tekst w formacie Prometheus; w trybie wieloprocesowym zsumowany ze wszystkich procesów."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
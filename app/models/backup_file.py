@@ -3,6 +3,11 @@ from app.db import db
 
 class BackupFile(db.Model):
     __tablename__ = "backup_files"
+    __table_args__ = (
+        db.Index("ix_backup_files_deleted_creation_time", "deleted", "creation_time"),
+        db.Index("ix_backup_files_task_id_deleted", "task_id", "deleted"),
+        db.Index("ix_backup_files_deleted_last_verified_at", "deleted", "last_verified_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -22,7 +27,32 @@ class BackupFile(db.Model):
 
     deleted = db.Column(db.Boolean, default=False, nullable=False)
 
+    # Plik przechowywany jako fragmenty w magazynie deduplikacji (app/dedup.py)
+    deduplicated = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
+    stored_size = db.Column(db.BigInteger, nullable=True)
+    ingest_ms = db.Column(db.Integer, nullable=True)
+
+    # Łańcuch kopii przyrostowych: poziom 0 - pełna, poziom 1 - zmiany względem parent
+    level = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    parent_id = db.Column(
+        db.Integer,
+        db.ForeignKey("backup_files.id", ondelete="RESTRICT"),
+        nullable=True,
+        index=True
+    )
+
+    # Ostatnia weryfikacja sumy kontrolnej przez zadanie scrub (app/scrub.py)
+    last_verified_at = db.Column(db.DateTime, nullable=True)
+    verify_failed = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
+
     task = db.relationship("BackupTask", back_populates="files", lazy=True)
+    parent = db.relationship("BackupFile", remote_side=[id], lazy=True)
+
+    def restore_chain(self):
+        """Pliki potrzebne do odtworzenia stanu z tej kopii, w kolejności rozpakowania."""
+        if self.level and self.parent is not None:
+            return [self.parent, self]
+        return [self]
 
     def mark_deleted(self):
         self.deleted = True
@@ -0,0 +1,75 @@
+from app.db import db
+from sqlalchemy import Enum
+from datetime import datetime, timezone
+
+
+class BackupRun(db.Model):
+    __tablename__ = "backup_runs"
+    __table_args__ = (
+        db.Index("ix_backup_runs_task_id_started_at", "task_id", "started_at"),
+        db.Index("ix_backup_runs_started_at", "started_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    task_id = db.Column(
+        db.Integer,
+        db.ForeignKey("backup_tasks.id", ondelete="RESTRICT"),
+        nullable=False
+    )
+
+    server_id = db.Column(
+        db.Integer,
+        db.ForeignKey("servers.id", ondelete="RESTRICT"),
+        nullable=False
+    )
+
+    backup_file_id = db.Column(
+        db.Integer,
+        db.ForeignKey("backup_files.id", ondelete="SET NULL"),
+        nullable=True
+    )
+
+    status = db.Column(
+        Enum("w toku", "sukces", "ponowienie", "błąd", name="backup_run_status"),
+        default="w toku",
+        nullable=False
+    )
+
+    # Numer próby: 0 - pierwsze wykonanie, kolejne - ponowienia Celery
+    attempt = db.Column(db.Integer, default=0, nullable=False)
+
+    started_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None)
+    )
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Czasy etapów w milisekundach
+    duration_ms = db.Column(db.Integer, nullable=True)
+    queue_wait_ms = db.Column(db.Integer, nullable=True)
+    remote_ms = db.Column(db.Integer, nullable=True)
+    transfer_ms = db.Column(db.Integer, nullable=True)
+    hash_ms = db.Column(db.Integer, nullable=True)
+
+    archive_bytes = db.Column(db.BigInteger, nullable=True)
+    staging_bytes = db.Column(db.BigInteger, nullable=True)
+    level = db.Column(db.Integer, nullable=True)
+
+    exit_code = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    task = db.relationship("BackupTask", lazy=True)
+    server = db.relationship("Server", lazy=True)
+    backup_file = db.relationship("BackupFile", lazy=True)
+
+    @property
+    def throughput_mbps(self):
+        """Przepustowość transferu (MB/s) pobranego archiwum."""
+        if not self.archive_bytes or not self.transfer_ms:
+            return None
+        return self.archive_bytes / (1024 * 1024) / (self.transfer_ms / 1000)
+
+    def __repr__(self):
+        return f"<BackupRun id={self.id} task_id={self.task_id} status={self.status} attempt={self.attempt}>"
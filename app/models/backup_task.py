@@ -1,9 +1,21 @@
 from app.db import db
 from sqlalchemy import Enum
+from croniter import croniter
+from datetime import datetime, timezone
+
+
+# Maksymalny poziom kompresji dla obsługiwanych kompresorów
+COMPRESSION_MAX_LEVELS = {"gzip": 9, "pigz": 9, "zstd": 19}
+DEFAULT_COMPRESSION = "gzip"
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_FULL_BACKUP_EVERY = 7
 
 
 class BackupTask(db.Model):
     __tablename__ = "backup_tasks"
+    __table_args__ = (
+        db.Index("ix_backup_tasks_deleted_last_status", "deleted", "last_status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -24,6 +36,34 @@ class BackupTask(db.Model):
         nullable=True
     )
 
+    next_run_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    compression = db.Column(
+        Enum(*COMPRESSION_MAX_LEVELS, name="compression_type"),
+        default=DEFAULT_COMPRESSION,
+        server_default=DEFAULT_COMPRESSION,
+        nullable=False
+    )
+    compression_level = db.Column(
+        db.Integer,
+        default=DEFAULT_COMPRESSION_LEVEL,
+        server_default=str(DEFAULT_COMPRESSION_LEVEL),
+        nullable=False
+    )
+
+    # Archiwum bez GPG po stronie klienta, deduplikowane i szyfrowane w magazynie menedżera
+    dedup = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
+
+    # Kopie przyrostowe (tar --listed-incremental): pełna kopia co full_backup_every uruchomień,
+    # pomiędzy nimi kopie poziomu 1 względem ostatniej pełnej
+    incremental = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
+    full_backup_every = db.Column(
+        db.Integer,
+        default=DEFAULT_FULL_BACKUP_EVERY,
+        server_default=str(DEFAULT_FULL_BACKUP_EVERY),
+        nullable=False
+    )
+
     server = db.relationship("Server", back_populates="backup_tasks")
 
     files = db.relationship(
@@ -38,6 +78,59 @@ class BackupTask(db.Model):
         lazy=True
     )
 
+    def schedule_next_run(self, after=None):
+        """Wylicza i zapisuje najbliższy termin uruchomienia (UTC) po podanym czasie."""
+        if after is None:
+            after = datetime.now(timezone.utc)
+        after = after.replace(tzinfo=None)
+        self.next_run_at = croniter(self.schedule, after).get_next(datetime)
+        return self.next_run_at
+
+    def incremental_parent(self):
+        """Ostatnia pełna kopia, względem której powstanie kolejna kopia przyrostowa;
+        None, gdy należy wykonać nową kopię pełną."""
+        from app.models.backup_file import BackupFile
+
+        if not self.incremental:
+            return None
+
+        parent = (
+            BackupFile.query
+            .filter(
+                BackupFile.task_id == self.id,
+                BackupFile.deleted == False,
+                BackupFile.level == 0
+            )
+            .order_by(BackupFile.creation_time.desc(), BackupFile.id.desc())
+            .first()
+        )
+        if parent is None:
+            return None
+
+        increments = (
+            BackupFile.query
+            .filter(BackupFile.parent_id == parent.id, BackupFile.deleted == False)
+            .count()
+        )
+        if increments + 1 >= (self.full_backup_every or DEFAULT_FULL_BACKUP_EVERY):
+            return None
+        return parent
+
+    def backup_command(self, parent=None):
+        """Polecenie run_backup dla wyzwalacza; ustawienia domyślne są pomijane,
+        aby zachować zgodność z klientami zainstalowanymi starszym skryptem."""
+        compression = self.compression or DEFAULT_COMPRESSION
+        level = self.compression_level or DEFAULT_COMPRESSION_LEVEL
+        if self.incremental:
+            mode = "dedup" if self.dedup else "gpg"
+            kind = f"incr {parent.name}" if parent else "full"
+            return f"run_backup {self.name} {compression} {level} {mode} {kind}"
+        if self.dedup:
+            return f"run_backup {self.name} {compression} {level} dedup"
+        if compression == DEFAULT_COMPRESSION and level == DEFAULT_COMPRESSION_LEVEL:
+            return f"run_backup {self.name}"
+        return f"run_backup {self.name} {compression} {level}"
+
     def mark_deleted(self):
         self.deleted = True
 
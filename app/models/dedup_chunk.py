@@ -0,0 +1,46 @@
+from app.db import db
+
+
+class DedupChunk(db.Model):
+    __tablename__ = "dedup_chunks"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # HMAC-SHA256 treści fragmentu (kluczem magazynu), nie zwykły skrót - nie ujawnia zawartości
+    digest = db.Column(db.String(64), nullable=False, index=True)
+
+    size = db.Column(db.Integer, nullable=False)
+    stored_size = db.Column(db.Integer, nullable=False)
+
+    # Liczba odwołań z backup_file_chunks; fragment z refcount 0 nie jest już używany ponownie
+    refcount = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return f"<DedupChunk id={self.id} size={self.size} refcount={self.refcount}>"
+
+
+class BackupFileChunk(db.Model):
+    __tablename__ = "backup_file_chunks"
+    __table_args__ = (
+        db.Index("ix_backup_file_chunks_file_seq", "backup_file_id", "seq"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    backup_file_id = db.Column(
+        db.Integer,
+        db.ForeignKey("backup_files.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    seq = db.Column(db.Integer, nullable=False)
+
+    chunk_id = db.Column(
+        db.Integer,
+        db.ForeignKey("dedup_chunks.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True
+    )
+
+    def __repr__(self):
+        return f"<BackupFileChunk file_id={self.backup_file_id} seq={self.seq} chunk_id={self.chunk_id}>"
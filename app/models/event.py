@@ -5,6 +5,10 @@ from datetime import datetime, timezone
 
 class Event(db.Model):
     __tablename__ = "events"
+    __table_args__ = (
+        db.Index("ix_events_type_timestamp", "type", "timestamp"),
+        db.Index("ix_events_timestamp_id", "timestamp", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -2,6 +2,13 @@ from app.db import db
 from sqlalchemy import Enum
 
 
+# Szyfry transportu SSH dla rsync, od najszybszych na sprzęcie z AES-NI
+SSH_CIPHERS = (
+    "aes128-gcm@openssh.com",
+    "aes256-gcm@openssh.com",
+    "chacha20-poly1305@openssh.com",
+    "aes128-ctr",
+)
 
 class Server(db.Model):
     __tablename__ = "servers"
@@ -17,6 +24,19 @@ class Server(db.Model):
 )
     deleted = db.Column(db.Boolean, default=False)
 
+    # Wynik ostatniego sprawdzenia połączenia (app/health.py)
+    last_check_at = db.Column(db.DateTime, nullable=True)
+    last_check_latency_ms = db.Column(db.Integer, nullable=True)
+
+    # Profil transferu rsync - domyślnie bez kompresji, bo archiwa są już skompresowane i zaszyfrowane
+    transfer_compress = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
+    transfer_cipher = db.Column(db.String(64), default=SSH_CIPHERS[0], server_default=SSH_CIPHERS[0], nullable=False)
+    transfer_bwlimit = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    transfer_partial = db.Column(db.Boolean, default=True, server_default="1", nullable=False)
+
+    # Maksymalna liczba jednocześnie wykonywanych kopii na tym serwerze (0 = bez limitu)
+    max_concurrent_backups = db.Column(db.Integer, default=1, server_default="1", nullable=False)
+
     def mark_deleted(self):
         self.deleted = True
         for task in self.backup_tasks:
@@ -25,6 +45,22 @@ class Server(db.Model):
     def restore(self):
         self.deleted = False
 
+    def rsync_options(self):
+        """Opcje rsync wynikające z profilu transferu serwera."""
+        options = ["-a", "--whole-file"]
+        if self.transfer_compress:
+            options.append("-z")
+        if self.transfer_partial:
+            options.append("--partial")
+        if self.transfer_bwlimit:
+            options.append(f"--bwlimit={self.transfer_bwlimit}")
+        return options
+
+    def ssh_transport_options(self):
+        """Opcje ssh (-e) dla rsync: wybrany szyfr i kompresja SSH zawsze wyłączona."""
+        cipher = self.transfer_cipher if self.transfer_cipher in SSH_CIPHERS else SSH_CIPHERS[0]
+        return ["-c", cipher, "-o", "Compression=no", "-o", "IPQoS=throughput"]
+
     backup_tasks = db.relationship("BackupTask", back_populates="server", lazy=True)
     
     events = db.relationship(
@@ -1,10 +1,11 @@
 from flask import Blueprint, render_template
 from flask_login import login_required
 from app.decorators import check_settings
-from app.models.server import Server
-from app.models.backup_task import BackupTask
-from app.models.backup_file import BackupFile
-from app.models.event import Event
+from app.concurrency import get_occupancy, CONTROL_QUEUE, BACKUP_QUEUE
+from app.config import Config
+from app.db import db
+from app.stats import get_dashboard_stats
+from app.scrub import get_last_scrub_run
 
 dashboard_bp = Blueprint('dashboard', __name__, template_folder='templates')
 
@@ -13,19 +14,48 @@ dashboard_bp = Blueprint('dashboard', __name__, template_folder='templates')
 @login_required
 @check_settings
 def index():
-    server_count = Server.query.filter_by(deleted=False).count()
-    tasks = BackupTask.query.filter_by(deleted=False)
-    task_count = tasks.count()
-    fails_count = tasks.filter_by(last_status="błąd").count()
-    file_count = BackupFile.query.filter_by(deleted=False).count()
+    stats = get_dashboard_stats()
 
-    last_errors = Event.query.filter_by(type="błąd").order_by(Event.timestamp.desc()).limit(5).all()
+    occupancy = None
+    servers = stats["active_servers"]
+    try:
+        running, per_server, per_queue = get_occupancy(
+            [s["id"] for s in servers],
+            [CONTROL_QUEUE, BACKUP_QUEUE]
+        )
+        occupancy = {
+            "running": running,
+            "global_limit": Config.BACKUP_GLOBAL_CONCURRENCY,
+            "servers": [(s, per_server.get(s["id"], 0)) for s in servers],
+            "queues": per_queue
+        }
+    except Exception:
+        pass
 
     return render_template(
         'dashboard.html',
-        server_count=server_count,
-        task_count=task_count,
-        fails_count=fails_count,
-        file_count=file_count,
-        last_errors=last_errors
-    )
\ No newline at end of file
+        server_count=stats["server_count"],
+        task_count=stats["task_count"],
+        fails_count=stats["fails_count"],
+        file_count=stats["file_count"],
+        stored_gb=stats["stored_bytes"] / (1024 ** 3),
+        backups_24h=stats["backups_24h"],
+        last_errors=stats["last_errors"],
+        occupancy=occupancy,
+        # Pokrycie weryfikacją: pliki sprawdzone w ciągu SCRUB_REVERIFY_DAYS
+        verified_pct=100 * stats["verified_count"] / stats["file_count"] if stats["file_count"] else 100.0,
+        verify_failed_count=stats["verify_failed_count"],
+        last_scrub=get_last_scrub_run()
+    )
+
+
+@dashboard_bp.route('/db-pool-stats')
+@login_required
+@check_settings
+def db_pool_stats():
+    """Stan puli połączeń z bazą w bieżącym procesie (zbiorczo dla wszystkich procesów: /metrics)."""
+    pool = db.engine.pool
+    if not hasattr(pool, "stats"):
+        # Np. SQLite w pamięci (StaticPool) - brak puli z pomiarem
+        return {"role": Config.DB_ROLE, "pool": pool.status()}
+    return pool.stats()
@@ -1,71 +1,259 @@
-from flask import Blueprint, render_template, request, send_file, flash, redirect, url_for
+import os
+import zipfile
+from urllib.parse import quote
+from flask import Blueprint, Response, current_app, render_template, request, send_file, flash, redirect, url_for, stream_with_context
 from flask_login import login_required
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
 from app.decorators import check_settings
+from app.db import db
 from app.models.backup_task import BackupTask
 from app.models.backup_file import BackupFile
+from app.dedup import iter_file_chunks
 
 files_bp = Blueprint('files', __name__, url_prefix='/files')
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+FILES_PER_PAGE = 50
+
+
+def format_size(size):
+    return f"{(size or 0) / (1024*1024):.2f} MB"
+
 
 @files_bp.route('/')
 @login_required
 @check_settings
 def index():
-    tasks_query = BackupTask.query.filter_by().all()
+    # Agregaty liczone w bazie na niesuniętych plikach; zadania bez plików są pomijane
+    stats = (
+        db.session.query(
+            BackupFile.task_id.label('task_id'),
+            func.count(BackupFile.id).label('file_count'),
+            func.sum(BackupFile.size).label('total_size'),
+            func.max(BackupFile.creation_time).label('newest'),
+            func.sum(case((BackupFile.deduplicated == True, BackupFile.size), else_=0)).label('dedup_size'),
+            func.sum(BackupFile.stored_size).label('stored_size'),
+            func.sum(BackupFile.ingest_ms).label('ingest_ms')
+        )
+        .filter(BackupFile.deleted == False)
+        .group_by(BackupFile.task_id)
+        .subquery()
+    )
 
-    tasks = []
-    for task in tasks_query:
-        task_data = {
+    rows = (
+        db.session.query(
+            BackupTask,
+            stats.c.file_count,
+            stats.c.total_size,
+            stats.c.newest,
+            stats.c.dedup_size,
+            stats.c.stored_size,
+            stats.c.ingest_ms
+        )
+        .join(stats, stats.c.task_id == BackupTask.id)
+        .options(joinedload(BackupTask.server))
+        .order_by(BackupTask.id)
+        .all()
+    )
+
+    tasks = [
+        {
             'id': task.id,
             'name': task.name,
             'server': task.server,
             'deleted': task.deleted,
-            'files': []
+            'file_count': file_count,
+            'total_size': format_size(total_size),
+            'newest': newest,
+            # Współczynnik deduplikacji i przepustowość przyjmowania plików do magazynu fragmentów
+            'dedup_ratio': dedup_size / stored_size if stored_size else None,
+            'dedup_throughput': dedup_size / (1024*1024) / (ingest_ms / 1000) if ingest_ms else None
         }
-        for file in task.files:
-            if not file.deleted:
-                task_data['files'].append({
-                    'id': file.id,
-                    'name': file.name,
-                    'size': f"{file.size / (1024*1024):.2f} MB",
-                    'checksum': file.checksum,
-                    'created': file.creation_time
-                })
+        for task, file_count, total_size, newest, dedup_size, stored_size, ingest_ms in rows
+    ]
+
+    return render_template('files.html', tasks=tasks, per_page=FILES_PER_PAGE)
+
+
+@files_bp.route('/task/<int:task_id>')
+@login_required
+@check_settings
+def task_files(task_id):
+    """Strona plików zadania w JSON, ładowana po rozwinięciu zadania na liście."""
+    page = request.args.get('page', 1, type=int)
+    pagination = (
+        BackupFile.query
+        .filter(BackupFile.task_id == task_id, BackupFile.deleted == False)
+        .order_by(BackupFile.creation_time.desc(), BackupFile.id.desc())
+        .paginate(page=page, per_page=FILES_PER_PAGE, error_out=False)
+    )
+
+    return {
+        'files': [
+            {
+                'id': file.id,
+                'name': file.name,
+                'size': format_size(file.size),
+                'checksum': file.checksum,
+                'created': file.creation_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'url': url_for('files.download_file', file_id=file.id),
+                'level': file.level,
+                'restore_url': url_for('files.restore_file', file_id=file.id) if file.level else None
+            }
+            for file in pagination.items
+        ],
+        'page': pagination.page,
+        'has_next': pagination.has_next
+    }
+
+
+class _ZipStreamBuffer:
+    """Nieprzewijalny strumień dla zipfile - zbiera zapisane bajty do odebrania przez generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_file_content(file):
+    """Treść pliku kopii w porcjach - z dysku lub odtwarzana z magazynu deduplikacji."""
+    if file.deduplicated:
+        yield from iter_file_chunks(file)
+        return
+
+    with open(file.path, 'rb') as src:
+        while True:
+            chunk = src.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def is_available(file):
+    return file.deduplicated or os.path.exists(file.path)
 
-        tasks.append(task_data)
 
-    return render_template('files.html', tasks=tasks)
+def stream_zip(files):
+    """Generuje archiwum ZIP (wpisy STORED) bez trzymania plików w pamięci."""
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for file in files:
+            info = zipfile.ZipInfo(file.name, file.creation_time.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            # Znany rozmiar pozwala zipfile samodzielnie włączyć ZIP64 dla plików > 4 GiB
+            info.file_size = file.size
+            with zf.open(info, 'w') as dest:
+                for chunk in iter_file_content(file):
+                    dest.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
 
 
+def send_backup_file(path):
+    """Wysyła plik kopii przez Flask albo zleca to serwerowi proxy nagłówkiem X-Accel-Redirect / X-Sendfile."""
+    mode = current_app.config.get('FILE_DOWNLOAD_OFFLOAD')
+    backup_folder = os.path.realpath(current_app.config['BACKUP_FOLDER'])
+    real_path = os.path.realpath(path)
+
+    # Proxy udostępnia wyłącznie katalog kopii - pliki spoza niego wysyła aplikacja
+    if mode not in ('x-accel', 'x-sendfile') or os.path.commonpath([backup_folder, real_path]) != backup_folder:
+        # conditional=True - obsługa nagłówka Range i wznawiania pobierania
+        return send_file(path, as_attachment=True, conditional=True)
+
+    response = Response(mimetype='application/octet-stream')
+    response.headers["Content-Disposition"] = f"attachment; filename=\"{os.path.basename(real_path)}\""
+    if mode == 'x-accel':
+        location = current_app.config['X_ACCEL_LOCATION'].rstrip('/')
+        relative = os.path.relpath(real_path, backup_folder)
+        response.headers["X-Accel-Redirect"] = f"{location}/{quote(relative)}"
+    else:
+        response.headers["X-Sendfile"] = real_path
+    return response
+
+
+@files_bp.route('/<int:file_id>/download')
+@login_required
+def download_file(file_id):
+    file = BackupFile.query.filter_by(id=file_id, deleted=False).first()
+    if not file or not is_available(file):
+        flash("Nie znaleziono plików do pobrania.", "danger")
+        return redirect(url_for('files.index'))
+
+    if file.deduplicated:
+        response = Response(stream_with_context(iter_file_content(file)), mimetype='application/octet-stream')
+        response.headers["Content-Disposition"] = f"attachment; filename=\"{file.name}\""
+        response.headers["Content-Length"] = str(file.size)
+        return response
+
+    return send_backup_file(file.path)
 
 
 @files_bp.route('/download', methods=['POST'])
 @login_required
 def download_files():
-    file_ids = request.form.getlist('file_ids')
+    file_ids = [int(file_id) for file_id in request.form.getlist('file_ids') if file_id.isdigit()]
     if not file_ids:
         flash("Nie zaznaczono żadnych plików!", "warning")
         return redirect(url_for('files.index'))
 
-    import os, io, zipfile
-    files_to_send = []
-
-    for file_id in file_ids:
-        file = BackupFile.query.get(file_id)
-        if file and not file.deleted and os.path.exists(file.path):
-            files_to_send.append(file.path)
+    files = (
+        BackupFile.query
+        .filter(BackupFile.id.in_(file_ids), BackupFile.deleted == False)
+        .order_by(BackupFile.id)
+        .all()
+    )
+    files_to_send = [file for file in files if is_available(file)]
 
     if not files_to_send:
         flash("Nie znaleziono plików do pobrania.", "danger")
         return redirect(url_for('files.index'))
 
     if len(files_to_send) == 1:
-        return send_file(files_to_send[0], as_attachment=True)
-
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w') as zf:
-        for path in files_to_send:
-            zf.write(path, os.path.basename(path))
-    memory_file.seek(0)
-    return send_file(memory_file, mimetype='application/zip',
-                     as_attachment=True, download_name='backup_files.zip')
\ No newline at end of file
+        # Przekierowanie na GET, aby przeglądarka mogła wznowić przerwane pobieranie
+        return redirect(url_for('files.download_file', file_id=files_to_send[0].id), code=303)
+
+    # Atrybuty plików są już wczytane - połączenie nie jest potrzebne na czas (długiej) wysyłki
+    db.session.close()
+    response = Response(stream_with_context(stream_zip(files_to_send)), mimetype='application/zip')
+    response.headers["Content-Disposition"] = "attachment; filename=backup_files.zip"
+    return response
+
+
+@files_bp.route('/<int:file_id>/restore')
+@login_required
+def restore_file(file_id):
+    """Archiwum ZIP z łańcuchem kopii (pełna + przyrostowa) potrzebnym do odtworzenia stanu z danej kopii.
+
+    Pliki rozpakowuje się po kolei poleceniem `tar --listed-incremental=/dev/null -xf`
+    (po odszyfrowaniu i dekompresji), zaczynając od kopii pełnej.
+    """
+    file = BackupFile.query.filter_by(id=file_id, deleted=False).first()
+    if not file:
+        flash("Nie znaleziono plików do pobrania.", "danger")
+        return redirect(url_for('files.index'))
+
+    chain = file.restore_chain()
+    if any(item.deleted or not is_available(item) for item in chain):
+        flash("Łańcuch kopii przyrostowych jest niekompletny - brak kopii pełnej.", "danger")
+        return redirect(url_for('files.index'))
+
+    if len(chain) == 1:
+        return redirect(url_for('files.download_file', file_id=file.id), code=303)
+
+    db.session.close()
+    response = Response(stream_with_context(stream_zip(chain)), mimetype='application/zip')
+    response.headers["Content-Disposition"] = f"attachment; filename=\"{os.path.splitext(file.name)[0]}_restore.zip\""
+    return response
@@ -0,0 +1,32 @@
+from flask import Blueprint, current_app
+from flask_login import login_required
+from redis.exceptions import RedisError
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+@jobs_bp.route('/<job_id>')
+@login_required
+def status(job_id):
+    """Stan operacji wykonywanej w tle (Celery) - odpytywany przez stronę, która ją zleciła."""
+    from app.tasks_celery import bulk_remote_operations
+
+    result = bulk_remote_operations.AsyncResult(job_id)
+
+    try:
+        state = result.state
+        info = result.info
+    except RedisError as e:
+        # Backend wyników niedostępny - strona ponowi zapytanie
+        current_app.logger.warning("Nie udało się odczytać stanu operacji %s: %s", job_id, e)
+        return {"state": "unknown"}
+
+    # Wynik niebędący słownikiem (None, lista, wartość) trafia pod klucz "result"
+    details = info if isinstance(info, dict) else {"result": info}
+    if state == "PROGRESS":
+        return {"state": "running", **details}
+    if state == "SUCCESS":
+        return {"state": "finished", **details}
+    if state == "FAILURE":
+        return {"state": "failed", "error": str(info)}
+    return {"state": "pending"}
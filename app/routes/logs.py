@@ -1,26 +1,35 @@
-from flask import Blueprint, render_template, make_response, request
+from flask import Blueprint, Response, current_app, render_template, request, stream_with_context
 from flask_login import login_required
+from app.concurrency import get_redis
 from app.decorators import check_settings
 from app.models.event import Event
+from app.models.backup_task import BackupTask
+from app.models.server import Server
 import csv
+import base64
+import hashlib
+import json
+import zlib
 from io import StringIO
 from datetime import datetime
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import joinedload
 
 logs_bp = Blueprint('logs', __name__, url_prefix='/logs')
 
-@logs_bp.route('/')
-@login_required
-@check_settings
-def index():
-    selected_types = request.args.getlist('type')
-    all_types = ('informacja', 'błąd', 'logowanie')
-    if not selected_types:
-        selected_types = list(all_types)
+ALL_TYPES = ('informacja', 'błąd', 'logowanie')
+PER_PAGE = 20
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_KEY = "logs:count:{}"
+EXPORT_CHUNK_ROWS = 1000
 
-    query = Event.query.order_by(Event.timestamp.desc()).filter(Event.type.in_(selected_types))
 
-    start_date = request.args.get('start')
-    end_date = request.args.get('end')
+def filtered_events_query(selected_types, start_date, end_date):
+    query = Event.query
+
+    # Filtr typu tylko gdy nie wybrano wszystkich - pozwala użyć indeksu (timestamp, id)
+    if set(selected_types) != set(ALL_TYPES):
+        query = query.filter(Event.type.in_(selected_types))
 
     if start_date:
         try:
@@ -37,10 +46,68 @@ def index():
         except ValueError:
             pass
 
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    events = pagination.items
+    return query
+
+
+def encode_cursor(event):
+    raw = f"{event.timestamp.replace(tzinfo=None).isoformat()}|{event.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, event_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def get_request_filters():
+    selected_types = [t for t in request.args.getlist('type') if t in ALL_TYPES]
+    if not selected_types:
+        selected_types = list(ALL_TYPES)
+    return selected_types, request.args.get('start'), request.args.get('end')
+
+
+@logs_bp.route('/')
+@login_required
+@check_settings
+def index():
+    selected_types, start_date, end_date = get_request_filters()
+    query = filtered_events_query(selected_types, start_date, end_date)
+
+    # Paginacja kluczem (timestamp, id): stały koszt niezależnie od głębokości strony
+    after = decode_cursor(request.args.get('after', ''))
+    before = decode_cursor(request.args.get('before', ''))
+
+    if before:
+        ts, event_id = before
+        query = query.filter(or_(
+            Event.timestamp > ts,
+            and_(Event.timestamp == ts, Event.id > event_id)
+        )).order_by(Event.timestamp.asc(), Event.id.asc())
+    else:
+        if after:
+            ts, event_id = after
+            query = query.filter(or_(
+                Event.timestamp < ts,
+                and_(Event.timestamp == ts, Event.id < event_id)
+            ))
+        query = query.order_by(Event.timestamp.desc(), Event.id.desc())
+
+    events = query.options(joinedload(Event.task), joinedload(Event.server)).limit(PER_PAGE + 1).all()
+    has_more = len(events) > PER_PAGE
+    events = events[:PER_PAGE]
+
+    if before:
+        events.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = bool(after), has_more
+
+    next_cursor = encode_cursor(events[-1]) if events and has_next else None
+    prev_cursor = encode_cursor(events[0]) if events and has_prev else None
 
     return render_template(
         'logs.html',
@@ -48,33 +115,96 @@ def index():
         selected_types=selected_types,
         start_date=start_date,
         end_date=end_date,
-        pagination=pagination
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
     )
 
 
+@logs_bp.route('/count')
+@login_required
+@check_settings
+def count():
+    """Liczba zdarzeń dla filtrów, liczona na żądanie i buforowana w Redis przez COUNT_CACHE_TTL sekund.
+
+    Klucze wygasają w Redis, więc dowolne filtry podane przez klienta nie zajmują pamięci procesu.
+    """
+    selected_types, start_date, end_date = get_request_filters()
+    filters = json.dumps([sorted(selected_types), start_date, end_date])
+    key = COUNT_CACHE_KEY.format(hashlib.sha256(filters.encode()).hexdigest())
+
+    try:
+        cached = get_redis().get(key)
+        if cached is not None:
+            return {"count": int(cached), "cached": True}
+    except Exception:
+        current_app.logger.warning("Cache liczby zdarzeń niedostępny, liczenie bezpośrednio.")
+
+    total = filtered_events_query(selected_types, start_date, end_date).order_by(None).count()
+    try:
+        get_redis().setex(key, COUNT_CACHE_TTL, total)
+    except Exception:
+        pass
+    return {"count": total, "cached": False}
+
 
 @logs_bp.route('/export')
 @login_required
 @check_settings
 def export_logs():
-    events = Event.query.order_by(Event.timestamp.desc()).all()
-
-    si = StringIO()
-    cw = csv.writer(si)
-    
-    cw.writerow(['ID', 'Typ', 'Timestamp', 'Szczegóły', 'Zadanie', 'Serwer'])
-
-    for event in events:
-        cw.writerow([
-            event.id,
-            event.type,
-            event.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            event.details,
-            event.task.name if event.task else '',
-            event.server.name if event.server else ''
-        ])
-
-    output = make_response(si.getvalue())
-    output.headers["Content-Disposition"] = "attachment; filename=logs.csv"
-    output.headers["Content-type"] = "text/csv"
-    return output
\ No newline at end of file
+    """Eksport CSV strumieniowany wierszami z kursora - bez ładowania całej tabeli do pamięci."""
+    selected_types, start_date, end_date = get_request_filters()
+    compress = request.args.get('gzip') == '1'
+
+    query = (
+        filtered_events_query(selected_types, start_date, end_date)
+        .outerjoin(Event.task)
+        .outerjoin(Event.server)
+        .with_entities(
+            Event.id,
+            Event.type,
+            Event.timestamp,
+            Event.details,
+            BackupTask.name,
+            Server.name
+        )
+        .order_by(Event.timestamp.desc(), Event.id.desc())
+        .yield_per(EXPORT_CHUNK_ROWS)
+    )
+
+    def generate_rows():
+        si = StringIO()
+        cw = csv.writer(si)
+        cw.writerow(['ID', 'Typ', 'Timestamp', 'Szczegóły', 'Zadanie', 'Serwer'])
+
+        for i, (event_id, event_type, timestamp, details, task_name, server_name) in enumerate(query, 1):
+            cw.writerow([
+                event_id,
+                event_type,
+                timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                details,
+                task_name or '',
+                server_name or ''
+            ])
+            if i % EXPORT_CHUNK_ROWS == 0:
+                yield si.getvalue().encode('utf-8')
+                si.seek(0)
+                si.truncate(0)
+
+        yield si.getvalue().encode('utf-8')
+
+    def generate_gzip():
+        # wbits=31 - nagłówek gzip, kompresja przyrostowa po każdym fragmencie
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in generate_rows():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    if compress:
+        output = Response(stream_with_context(generate_gzip()), mimetype='application/gzip')
+        output.headers["Content-Disposition"] = "attachment; filename=logs.csv.gz"
+    else:
+        output = Response(stream_with_context(generate_rows()), mimetype='text/csv')
+        output.headers["Content-Disposition"] = "attachment; filename=logs.csv"
+    return output
@@ -0,0 +1,19 @@
+import hmac
+from flask import Blueprint, Response, abort, current_app, request
+from flask_login import current_user
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.metrics import generate_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Metryki dla Prometheusa - z tokenem METRICS_TOKEN albo dla zalogowanego użytkownika."""
+    token = current_app.config.get("METRICS_TOKEN")
+    provided = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    # Nazwy serwerów i zadań nie mogą być dostępne bez uwierzytelnienia
+    if not (token and hmac.compare_digest(provided, token)) and not current_user.is_authenticated:
+        abort(401)
+
+    return Response(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, render_template, request
+from flask_login import login_required
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
+from app.decorators import check_settings
+from app.db import db
+from app.models.backup_task import BackupTask
+from app.models.backup_run import BackupRun
+
+runs_bp = Blueprint('runs', __name__, url_prefix='/runs')
+
+RECENT_RUNS_LIMIT = 100
+STATS_DAYS = 30
+TREND_DAYS = 7
+
+
+def duration_percentiles(since):
+    """p50/p95 czasu udanych przebiegów per zadanie (metoda najbliższej rangi), liczone w bazie."""
+    ranked = (
+        db.session.query(
+            BackupRun.task_id.label('task_id'),
+            BackupRun.started_at.label('started_at'),
+            BackupRun.duration_ms.label('duration_ms'),
+            func.row_number().over(
+                partition_by=BackupRun.task_id,
+                order_by=BackupRun.duration_ms
+            ).label('rn'),
+            func.count().over(partition_by=BackupRun.task_id).label('cnt')
+        )
+        .filter(
+            BackupRun.started_at >= since,
+            BackupRun.status == 'sukces',
+            BackupRun.duration_ms.isnot(None)
+        )
+        .subquery()
+    )
+
+    rows = (
+        db.session.query(
+            ranked.c.task_id,
+            func.min(case((ranked.c.rn >= ranked.c.cnt * 0.5, ranked.c.duration_ms))).label('p50'),
+            func.min(case((ranked.c.rn >= ranked.c.cnt * 0.95, ranked.c.duration_ms))).label('p95')
+        )
+        .group_by(ranked.c.task_id)
+        .all()
+    )
+    return {task_id: (p50, p95) for task_id, p50, p95 in rows}
+
+
+def run_counts(since):
+    rows = (
+        db.session.query(
+            BackupRun.task_id,
+            func.count(BackupRun.id),
+            func.sum(case((BackupRun.status == 'błąd', 1), else_=0)),
+            func.avg(case((BackupRun.status == 'sukces', BackupRun.archive_bytes))),
+            func.max(BackupRun.started_at)
+        )
+        .filter(BackupRun.started_at >= since)
+        .group_by(BackupRun.task_id)
+        .all()
+    )
+    return {task_id: (count, failed, avg_bytes, last) for task_id, count, failed, avg_bytes, last in rows}
+
+
+@runs_bp.route('/')
+@login_required
+@check_settings
+def index():
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    since = now - timedelta(days=STATS_DAYS)
+
+    percentiles = duration_percentiles(since)
+    # Mediana z ostatniego tygodnia pokazuje, czy zadanie zwalnia względem całego okresu
+    recent_percentiles = duration_percentiles(now - timedelta(days=TREND_DAYS))
+    counts = run_counts(since)
+
+    task_stats = []
+    if counts:
+        tasks = (
+            BackupTask.query
+            .filter(BackupTask.id.in_(counts.keys()))
+            .options(joinedload(BackupTask.server))
+            .order_by(BackupTask.id)
+            .all()
+        )
+        for task in tasks:
+            count, failed, avg_bytes, last = counts[task.id]
+            p50, p95 = percentiles.get(task.id, (None, None))
+            task_stats.append({
+                'task': task,
+                'runs': count,
+                'failed': failed or 0,
+                'p50': p50,
+                'p95': p95,
+                'p50_recent': recent_percentiles.get(task.id, (None, None))[0],
+                'avg_bytes': avg_bytes,
+                'last': last
+            })
+
+    selected_task = request.args.get('task_id', type=int)
+
+    runs_query = BackupRun.query.options(
+        joinedload(BackupRun.task),
+        joinedload(BackupRun.server),
+        joinedload(BackupRun.backup_file)
+    )
+    if selected_task:
+        runs_query = runs_query.filter(BackupRun.task_id == selected_task)
+    runs = runs_query.order_by(BackupRun.started_at.desc(), BackupRun.id.desc()).limit(RECENT_RUNS_LIMIT).all()
+
+    # Dane wykresów: udane przebiegi wybranego zadania z okresu statystyk
+    trend = []
+    if selected_task:
+        trend = [
+            {
+                'started_at': started_at.strftime("%Y-%m-%d %H:%M"),
+                'duration_s': round(duration_ms / 1000, 1),
+                'size_mb': round((archive_bytes or 0) / (1024 * 1024), 2)
+            }
+            for started_at, duration_ms, archive_bytes in (
+                db.session.query(BackupRun.started_at, BackupRun.duration_ms, BackupRun.archive_bytes)
+                .filter(
+                    BackupRun.task_id == selected_task,
+                    BackupRun.started_at >= since,
+                    BackupRun.status == 'sukces',
+                    BackupRun.duration_ms.isnot(None)
+                )
+                .order_by(BackupRun.started_at)
+                .all()
+            )
+        ]
+
+    return render_template(
+        'runs.html',
+        task_stats=task_stats,
+        runs=runs,
+        selected_task=db.session.get(BackupTask, selected_task) if selected_task else None,
+        trend=trend,
+        stats_days=STATS_DAYS,
+        trend_days=TREND_DAYS,
+        runs_limit=RECENT_RUNS_LIMIT
+    )
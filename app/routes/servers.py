@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import time
+from datetime import datetime, timezone
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from app.decorators import check_settings
 from app.db import db
-from app.models.server import Server
+from app.models.server import Server, SSH_CIPHERS
 from app.utils import load_install_script, execute_ssh_command
+from app.ssh_pool import get_ssh_pool
+from app.stats import invalidate_dashboard_stats
+from app.health import check_servers
+from app.bulk import remote_operation
 
 servers_bp = Blueprint('servers', __name__, url_prefix='/servers')
 
@@ -14,7 +20,12 @@ servers_bp = Blueprint('servers', __name__, url_prefix='/servers')
 def index():
     servers = Server.query.filter_by(deleted=False).all()
     install_script = load_install_script()
-    return render_template("servers.html", servers=servers, install_script=install_script)
+    return render_template(
+        "servers.html",
+        servers=servers,
+        install_script=install_script,
+        ssh_ciphers=SSH_CIPHERS
+    )
 
 
 @servers_bp.route('/add', methods=['POST'])
@@ -46,6 +57,7 @@ def add():
     server = Server(name=name, hostname=hostname, port=port)
     db.session.add(server)
     db.session.commit()
+    invalidate_dashboard_stats()
 
     flash("Serwer został dodany.", "success")
     return redirect(url_for("servers.index"))
@@ -71,10 +83,37 @@ def edit(server_id):
         flash("Serwer o tej nazwie już istnieje.", "danger")
         return redirect(url_for("servers.index"))
 
+    cipher = request.form.get("transfer_cipher", server.transfer_cipher)
+    if cipher not in SSH_CIPHERS:
+        flash("Nieobsługiwany szyfr SSH.", "danger")
+        return redirect(url_for("servers.index"))
+
+    try:
+        bwlimit = int(request.form.get("transfer_bwlimit") or 0)
+        if bwlimit < 0:
+            raise ValueError
+    except ValueError:
+        flash("Limit przepustowości musi być nieujemną liczbą.", "danger")
+        return redirect(url_for("servers.index"))
+
+    try:
+        max_concurrent = int(request.form.get("max_concurrent_backups") or 0)
+        if max_concurrent < 0:
+            raise ValueError
+    except ValueError:
+        flash("Limit równoległych kopii musi być nieujemną liczbą.", "danger")
+        return redirect(url_for("servers.index"))
+
     server.name = new_name
+    server.max_concurrent_backups = max_concurrent
+    server.transfer_cipher = cipher
+    server.transfer_bwlimit = bwlimit
+    server.transfer_compress = "transfer_compress" in request.form
+    server.transfer_partial = "transfer_partial" in request.form
     db.session.commit()
+    invalidate_dashboard_stats()
 
-    flash("Nazwa serwera została zaktualizowana.", "success")
+    flash("Serwer został zaktualizowany.", "success")
     return redirect(url_for("servers.index"))
 
 
@@ -90,21 +129,27 @@ def delete():
 
     servers = Server.query.filter(Server.id.in_(ids)).all()
 
-    for s in servers:
-        if s.status == "aktywny":
-            try:
-                success, output, error_output, exit_status = execute_ssh_command(
-                    s, "uninstall"
-                )
-                if not success:
-                    flash(f"Błąd deinstalacji na serwerze {s.hostname}.", "warning")
-            except Exception as e:
-                flash(f"Błąd deinstalacji na serwerze {s.hostname}.", "warning")
-
+    # Deinstalacja na serwerach wykonywana równolegle w tle - żądanie nie czeka na hosty
+    operations = [
+        remote_operation(s, "uninstall", "Deinstalacja systemu kopii")
+        for s in servers if s.status == "aktywny"
+    ]
 
+    for s in servers:
         s.mark_deleted()
 
     db.session.commit()
+    invalidate_dashboard_stats()
+
+    if operations:
+        from app.tasks_celery import bulk_remote_operations
+        job = bulk_remote_operations.delay(operations)
+        flash(
+            f"Usunięto {len(servers)} serwer/y oraz powiązane zadania. "
+            f"Deinstalacja na {len(operations)} serwerach trwa w tle.",
+            "success"
+        )
+        return redirect(url_for("servers.index", job=job.id))
 
     flash(f"Usunięto {len(servers)} serwer/y oraz powiązane zadania.", "success")
     return redirect(url_for("servers.index"))
@@ -116,16 +161,35 @@ def delete():
 def test_server_connection(server_id):
     server = Server.query.get_or_404(server_id)
 
+    started = time.monotonic()
     success, output, error_output, exit_status = execute_ssh_command(
-        server, "check", timeout=5
+        server, "check", timeout=current_app.config["HEALTH_CHECK_TIMEOUT"]
     )
 
     server.status = "aktywny" if success else "nieaktywny"
+    server.last_check_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    server.last_check_latency_ms = int((time.monotonic() - started) * 1000)
     db.session.commit()
+    invalidate_dashboard_stats()
 
     return {
         "success": success,
         "output": output,
         "error": error_output,
         "exit_code": exit_status
-    }, (200 if success else 400)
\ No newline at end of file
+    }, (200 if success else 400)
+
+
+@servers_bp.route("/check-all", methods=["POST"])
+@login_required
+@check_settings
+def check_all():
+    """Ponowne sprawdzenie wszystkich serwerów równolegle; strona odczytuje wyniki bez przeładowania."""
+    return {"servers": check_servers()}
+
+
+@servers_bp.route("/ssh-pool-stats")
+@login_required
+@check_settings
+def ssh_pool_stats():
+    return get_ssh_pool().stats()
@@ -3,7 +3,7 @@ from flask_login import login_required, current_user, logout_user
 from flask_mail import Message
 from app.db import db
 import os
-from app.utils import generate_code
+from app.utils import generate_code, invalidate_event_lookup_cache
 
 settings_bp = Blueprint('settings', __name__, template_folder='templates')
 
@@ -61,6 +61,7 @@ def verify_email_code():
     if code == stored_code:
         current_user.email_address = pending_email
         db.session.commit()
+        invalidate_event_lookup_cache()
         session.pop('pending_email', None)
         session.pop('verification_code', None)
         flash('Adres e-mail został potwierdzony i zapisany!', 'success')
@@ -77,6 +78,7 @@ def update_email_notifications():
     enabled = 'email_notifications' in request.form
     current_user.are_notifications_enabled = enabled
     db.session.commit()
+    invalidate_event_lookup_cache()
     flash('Powiadomienia e-mail zostały ' + ('włączone.' if enabled else 'wyłączone.'), 'success')
     return redirect(url_for('settings.index'))
 
@@ -2,10 +2,17 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from app.decorators import check_settings
 from app.db import db
-from app.models.backup_task import BackupTask
+from app.models.backup_task import (
+    BackupTask, COMPRESSION_MAX_LEVELS, DEFAULT_COMPRESSION, DEFAULT_COMPRESSION_LEVEL, DEFAULT_FULL_BACKUP_EVERY
+)
 from app.models.server import Server
 from app.utils import execute_ssh_command
+from app.stats import invalidate_dashboard_stats
+from app.bulk import remote_operation
+from app.dedup import get_store_key
+from sqlalchemy.orm import joinedload
 import re
+import time
 from croniter import croniter
 
 
@@ -13,6 +20,51 @@ from croniter import croniter
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/tasks')
 
 
+def parse_compression(form):
+    compression = form.get("compression") or DEFAULT_COMPRESSION
+    level = form.get("compression_level") or DEFAULT_COMPRESSION_LEVEL
+
+    if compression not in COMPRESSION_MAX_LEVELS:
+        raise ValueError("Nieobsługiwany kompresor.")
+
+    try:
+        level = int(level)
+    except ValueError:
+        raise ValueError("Poziom kompresji musi być liczbą.")
+
+    max_level = COMPRESSION_MAX_LEVELS[compression]
+    if level < 1 or level > max_level:
+        raise ValueError(f"Poziom kompresji dla {compression} musi mieścić się w zakresie 1-{max_level}.")
+
+    return compression, level
+
+
+def parse_incremental(form):
+    incremental = "incremental" in form
+    full_every = form.get("full_backup_every") or DEFAULT_FULL_BACKUP_EVERY
+
+    try:
+        full_every = int(full_every)
+    except ValueError:
+        raise ValueError("Częstotliwość kopii pełnej musi być liczbą.")
+
+    if full_every < 1:
+        raise ValueError("Kopia pełna musi być wykonywana co najmniej co 1 uruchomienie.")
+
+    return incremental, full_every
+
+
+def parse_dedup(form):
+    # Kopie deduplikowane nie są szyfrowane GPG - bez klucza magazynu zostałyby na dysku jawne
+    if "dedup" not in form:
+        return False
+    try:
+        get_store_key()
+    except (RuntimeError, ValueError) as e:
+        raise ValueError(f"Nie można włączyć deduplikacji: {e}")
+    return True
+
+
 @tasks_bp.route('/')
 @login_required
 @check_settings
@@ -29,7 +81,12 @@ def index():
     Server.deleted == False,
     Server.status == "aktywny"
     ).all()
-    return render_template('tasks.html', tasks=tasks, servers=servers)
+    return render_template(
+        'tasks.html',
+        tasks=tasks,
+        servers=servers,
+        compression_levels=COMPRESSION_MAX_LEVELS
+    )
 
 
 @tasks_bp.route('/add', methods=['POST'])
@@ -58,6 +115,14 @@ def add():
         flash("Niepoprawny format harmonogramu. Użyj składni crona, np. '0 3 * * *'.", "danger")
         return redirect(url_for("tasks.index"))
 
+    try:
+        compression, compression_level = parse_compression(request.form)
+        incremental, full_backup_every = parse_incremental(request.form)
+        dedup = parse_dedup(request.form)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("tasks.index"))
+
     existing_task = BackupTask.query.filter_by(server_id=server_id, name=name, deleted=False).first()
     if existing_task:
         flash(f"Zadanie o nazwie '{name}' już istnieje na tym serwerze.", "danger")
@@ -77,11 +142,18 @@ def add():
         server_id=server_id,
         schedule=schedule,
         retention=int(retention),
+        compression=compression,
+        compression_level=compression_level,
+        dedup=dedup,
+        incremental=incremental,
+        full_backup_every=full_backup_every,
         last_status=None
     )
+    task.schedule_next_run()
 
     db.session.add(task)
     db.session.commit()
+    invalidate_dashboard_stats()
     flash("Zadanie zostało dodane.", "success")
     return redirect(url_for("tasks.index"))
 
@@ -108,8 +180,22 @@ def edit(task_id):
         flash("Niepoprawny format harmonogramu. Użyj składni crona, np. '0 3 * * *'.", "danger")
         return redirect(url_for("tasks.index"))
 
+    try:
+        compression, compression_level = parse_compression(request.form)
+        incremental, full_backup_every = parse_incremental(request.form)
+        dedup = parse_dedup(request.form)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("tasks.index"))
+
     task.schedule = new_schedule
     task.retention = int(new_retention)
+    task.compression = compression
+    task.compression_level = compression_level
+    task.dedup = dedup
+    task.incremental = incremental
+    task.full_backup_every = full_backup_every
+    task.schedule_next_run()
 
     db.session.commit()
     flash("Zadanie zostało zaktualizowane.", "success")
@@ -126,27 +212,29 @@ def delete():
         flash("Nie wybrano żadnego zadania.", "warning")
         return redirect(url_for("tasks.index"))
 
-    tasks = BackupTask.query.filter(
+    tasks = BackupTask.query.options(joinedload(BackupTask.server)).filter(
         BackupTask.id.in_(ids),
         BackupTask.deleted == False
     ).all()
 
-    for t in tasks:
-        server = t.server
-
-        if server.status == "aktywny":
-            success, output, error_output, exit_status = execute_ssh_command(
-                server, f"delete_task {t.name}"
-            )
-            
-            if not success:
-                print(f"Błąd usuwania zadania {t.name} na serwerze {server.hostname}: {error_output}")
-            else:
-                print(f"Zadanie {t.name} zostało usunięte na serwerze {server.hostname}")
+    # Usuwanie skryptów zadań na serwerach wykonywane równolegle w tle
+    operations = [
+        remote_operation(t.server, f"delete_task {t.name}", f"Usunięcie zadania {t.name}", task_id=t.id)
+        for t in tasks if t.server.status == "aktywny"
+    ]
 
+    for t in tasks:
         t.mark_deleted()
 
     db.session.commit()
+    invalidate_dashboard_stats()
+
+    if operations:
+        from app.tasks_celery import bulk_remote_operations
+        job = bulk_remote_operations.delay(operations)
+        flash(f"Usunięto {len(tasks)} zadań. Usuwanie na serwerach trwa w tle.", "success")
+        return redirect(url_for("tasks.index", job=job.id))
+
     flash(f"Usunięto {len(tasks)} zadań.", "success")
     return redirect(url_for("tasks.index"))
 
@@ -162,7 +250,7 @@ def run_backup():
         flash("Nie wybrano zadania.", "danger")
         return redirect(url_for("tasks.index"))
 
-    run_backup_task_celery.delay(task_id)
+    run_backup_task_celery.delay(task_id, enqueued_at=time.time())
 
     flash("Wykonanie kopii zapasowej uruchomione w tle.", "info")
     return redirect(url_for("tasks.index"))
\ No newline at end of file
@@ -156,11 +156,19 @@ if [[ "$CMD" == "check" ]]; then
   exec /usr/bin/sudo /usr/local/sbin/check_install.sh
 fi
 
-# run_backup <task> - uruchamianie zadania kopii zapasowej
-if [[ "$CMD" =~ ^run_backup[[:space:]]+([A-Za-z0-9][A-Za-z0-9_-]*)$ ]]; then
+# run_backup <task> [<kompresor> <poziom> [gpg|dedup] [full|incr <plik bazowy>]] - uruchamianie zadania kopii zapasowej
+if [[ "$CMD" =~ ^run_backup[[:space:]]+([A-Za-z0-9][A-Za-z0-9_-]*)([[:space:]]+(gzip|pigz|zstd)[[:space:]]+([0-9]{1,2})([[:space:]]+(gpg|dedup))?([[:space:]]+(full|incr[[:space:]]+([A-Za-z0-9][A-Za-z0-9_.-]*)))?)?$ ]]; then
   TASK="${BASH_REMATCH[1]}"
-  log "INFO" "Allowed: run_backup task=$TASK" "trigger"
-  exec /usr/bin/sudo /usr/local/sbin/run_backup.sh "$TASK"
+  COMPRESSOR="${BASH_REMATCH[3]:-gzip}"
+  LEVEL="${BASH_REMATCH[4]:-6}"
+  MODE="${BASH_REMATCH[6]}"
+  KIND="${BASH_REMATCH[8]%%[[:space:]]*}"
+  PARENT="${BASH_REMATCH[9]}"
+  log "INFO" "Allowed: run_backup task=$TASK compressor=$COMPRESSOR level=$LEVEL mode=${MODE:-gpg} kind=${KIND:-none} parent=${PARENT:-none}" "trigger"
+  if [ -n "$KIND" ]; then
+    exec /usr/bin/sudo /usr/local/sbin/run_backup.sh "$TASK" "$COMPRESSOR" "$LEVEL" "${MODE:-gpg}" "$KIND" ${PARENT:+"$PARENT"}
+  fi
+  exec /usr/bin/sudo /usr/local/sbin/run_backup.sh "$TASK" "$COMPRESSOR" "$LEVEL" ${MODE:+"$MODE"}
 fi
 
 # add_task <task> - dodawanie zadania kopii zapasowej
@@ -221,15 +229,34 @@ log() {
     logger -t backup_system "[$level][$src] $msg"
 }
 
-log "INFO" "run_backup invoked TASK=${1:-}" "run_backup"
+log "INFO" "run_backup invoked TASK=${1:-} COMPRESSOR=${2:-gzip} LEVEL=${3:-6} MODE=${4:-gpg} KIND=${5:-none} PARENT=${6:-none}" "run_backup"
 
-if [ $# -ne 1 ]; then
-    echo "Użycie: $0 <task>" >&2
+if [ $# -ne 1 ] && [ $# -lt 3 ] || [ $# -gt 6 ]; then
+    echo "Użycie: $0 <task> [<gzip|pigz|zstd> <poziom> [gpg|dedup] [full|incr <plik bazowy>]]" >&2
     log "ERROR" "invalid arguments" "run_backup"
     exit 2
 fi
 
 TASK="$1"
+COMPRESSOR="${2:-gzip}"
+LEVEL="${3:-6}"
+MODE="${4:-gpg}"
+# Tryb przyrostowy: full - kopia poziomu 0 z nową migawką, incr - poziom 1 względem pliku bazowego
+KIND="${5:-}"
+PARENT="${6:-}"
+
+if [ -n "$KIND" ] && [ "$KIND" != "full" ] && [ "$KIND" != "incr" ]; then
+    log "ERROR" "invalid backup kind '$KIND'" "run_backup"
+    echo "Niepoprawny rodzaj kopii: $KIND" >&2
+    exit 3
+fi
+
+# Tryb dedup: archiwum bez szyfrowania GPG, deduplikowane i szyfrowane po stronie menedżera
+if [ "$MODE" != "gpg" ] && [ "$MODE" != "dedup" ]; then
+    log "ERROR" "invalid mode '$MODE'" "run_backup"
+    echo "Niepoprawny tryb: $MODE" >&2
+    exit 3
+fi
 
 # Walidacja nazwy zadania
 if ! [[ "$TASK" =~ ^[A-Za-z0-9][A-Za-z0-9_-]*$ ]]; then
@@ -238,21 +265,71 @@ if ! [[ "$TASK" =~ ^[A-Za-z0-9][A-Za-z0-9_-]*$ ]]; then
     exit 3
 fi
 
+# Walidacja kompresora i poziomu kompresji
+case "$COMPRESSOR" in
+    gzip|pigz) MAX_LEVEL=9 ;;
+    zstd) MAX_LEVEL=19 ;;
+    *)
+        log "ERROR" "invalid compressor '$COMPRESSOR'" "run_backup"
+        echo "Niepoprawny kompresor: $COMPRESSOR" >&2
+        exit 3
+        ;;
+esac
+
+if ! [[ "$LEVEL" =~ ^[0-9]+$ ]] || [ "$LEVEL" -lt 1 ] || [ "$LEVEL" -gt "$MAX_LEVEL" ]; then
+    log "ERROR" "invalid compression level '$LEVEL' for $COMPRESSOR" "run_backup"
+    echo "Niepoprawny poziom kompresji: $LEVEL" >&2
+    exit 3
+fi
+
+# Brak kompresora wielowątkowego - powrót do gzip
+if ! command -v "$COMPRESSOR" >/dev/null 2>&1; then
+    log "WARN" "$COMPRESSOR not installed, falling back to gzip" "run_backup"
+    COMPRESSOR="gzip"
+    if [ "$LEVEL" -gt 9 ]; then
+        LEVEL=9
+    fi
+fi
+
+THREADS=$(nproc 2>/dev/null || echo 1)
+case "$COMPRESSOR" in
+    gzip) COMPRESS_CMD=(gzip "-${LEVEL}" -c); EXT="tar.gz" ;;
+    pigz) COMPRESS_CMD=(pigz "-${LEVEL}" -p "$THREADS" -c); EXT="tar.gz" ;;
+    zstd) COMPRESS_CMD=(zstd "-${LEVEL}" -T0 -q -c); EXT="tar.zst" ;;
+esac
+
+# --rsyncable: niezmienione fragmenty danych dają identyczne fragmenty archiwum
+if [ "$MODE" = "dedup" ]; then
+    COMPRESS_CMD+=(--rsyncable)
+fi
+
 SCRIPTS_DIR="/srv/backup_scripts"
 FILES_DIR="/srv/backup_files"
 WORK_BASE="/srv/backup_tmp"
+STATE_BASE="/srv/backup_state"
 TASK_DIR="${WORK_BASE}/${TASK}"
 OUT_DIR="${TASK_DIR}/output"
+STATE_DIR="${STATE_BASE}/${TASK}"
 SCRIPT="${SCRIPTS_DIR}/${TASK}.sh"
 
+# W trybie przyrostowym katalog roboczy jest zachowywany między uruchomieniami,
+# aby tar mógł porównać pliki z migawką (--listed-incremental)
+cleanup_workdir() {
+    if [ -z "$KIND" ]; then
+        rm -rf "$TASK_DIR"
+    fi
+}
+
 if [ ! -x "$SCRIPT" ]; then
     echo "Skrypt zadania nie istnieje lub nie jest wykonywalny: $SCRIPT" >&2
     log "ERROR" "script not found or not executable: $SCRIPT" "run_backup"
     exit 4
 fi
 
+START_NS=$(date +%s%N)
+
 # Czyszczenie starego katalogu roboczego
-rm -rf "$TASK_DIR"
+cleanup_workdir
 mkdir -p "$OUT_DIR"
 
 log "INFO" "Executing task script: $SCRIPT (output=$OUT_DIR)" "run_backup"
@@ -264,39 +341,96 @@ log "INFO" "Executing task script: $SCRIPT (output=$OUT_DIR)" "run_backup"
 if ! find "$OUT_DIR" -mindepth 1 | read -r; then
     log "ERROR" "no output from task $TASK" "run_backup"
     echo "Brak danych wyjściowych z zadania: $TASK" >&2
-    rm -rf "$TASK_DIR"
+    cleanup_workdir
     exit 5
 fi
 
-# Tworzenie archiwum tar
-timestamp=$(date +"%Y%m%d%H%M%S")
-TAR_PATH="${TASK_DIR}/${TASK}_${timestamp}.tar.gz"
-tar -czf "$TAR_PATH" -C "$OUT_DIR" .
+STAGING_BYTES=$(du -sb "$OUT_DIR" | awk '{print $1}')
 
 # Ustawienie odbiorca GPG
 RECIPIENT=$(gpg --with-colons --list-keys 2>/dev/null | awk -F: '/^pub:/ {print $5; exit}')
-if [ -z "$RECIPIENT" ]; then
+if [ "$MODE" = "gpg" ] && [ -z "$RECIPIENT" ]; then
     log "ERROR" "no GPG recipient found" "run_backup"
     echo "Nie znaleziono odbiorcy GPG" >&2
-    rm -rf "$TASK_DIR"
+    cleanup_workdir
     exit 7
 fi
 
-ENC="${TAR_PATH}.gpg"
-log "INFO" "Encrypting -> $ENC (recipient $RECIPIENT)" "run_backup"
-gpg --batch --yes --trust-model always --recipient "$RECIPIENT" --output "$ENC" --encrypt "$TAR_PATH"
+# Migawka tar: poziom 1 tylko gdy istnieje migawka pełnej kopii o nazwie wskazanej przez menedżera,
+# w przeciwnym razie wykonywana jest nowa kopia pełna (poziom 0)
+BACKUP_LEVEL=""
+TAR_OPTS=()
+if [ -n "$KIND" ]; then
+    mkdir -p "$STATE_DIR"
+    chmod 700 "$STATE_DIR"
+    rm -f "$STATE_DIR/run.snar"
+    if [ "$KIND" = "incr" ] && [ -f "$STATE_DIR/level0.snar" ] \
+        && [ "$(cat "$STATE_DIR/level0.name" 2>/dev/null)" = "$PARENT" ]; then
+        cp "$STATE_DIR/level0.snar" "$STATE_DIR/run.snar"
+        BACKUP_LEVEL=1
+    else
+        if [ "$KIND" = "incr" ]; then
+            log "WARN" "no level-0 snapshot matching '$PARENT', running full backup" "run_backup"
+        fi
+        BACKUP_LEVEL=0
+    fi
+    TAR_OPTS=(--listed-incremental="$STATE_DIR/run.snar")
+fi
 
-# Przeniesienie plików do katalogu docelowego
-FINAL="${FILES_DIR}/$(basename "$ENC")"
-mv -f "$ENC" "$FINAL"
+# Strumieniowe tworzenie archiwum: tar | kompresor | gpg, bez plików pośrednich
+timestamp=$(date +"%Y%m%d%H%M%S")
+if [ "$MODE" = "gpg" ]; then
+    NAME="${TASK}_${timestamp}.${EXT}.gpg"
+    ENCRYPT_CMD=(gpg --batch --yes --trust-model always --compress-algo none --recipient "$RECIPIENT" --output - --encrypt)
+else
+    NAME="${TASK}_${timestamp}.${EXT}"
+    ENCRYPT_CMD=(cat)
+fi
+FINAL="${FILES_DIR}/${NAME}"
+PART="${FINAL}.part"
+
+# Suma SHA-256 liczona w locie (tee), bez ponownego odczytu archiwum
+log "INFO" "Streaming archive -> $FINAL ($COMPRESSOR -$LEVEL, mode $MODE, recipient ${RECIPIENT:-none})" "run_backup"
+if ! CHECKSUM=$(tar ${TAR_OPTS[@]+"${TAR_OPTS[@]}"} -cf - -C "$OUT_DIR" . \
+    | "${COMPRESS_CMD[@]}" \
+    | "${ENCRYPT_CMD[@]}" \
+    | tee "$PART" \
+    | sha256sum | awk '{print $1}'); then
+    log "ERROR" "archive pipeline failed for task $TASK" "run_backup"
+    echo "Błąd tworzenia zaszyfrowanego archiwum" >&2
+    rm -f "$PART"
+    rm -f "$STATE_DIR/run.snar"
+    cleanup_workdir
+    exit 8
+fi
+
+# Migawka pełnej kopii staje się bazą kolejnych kopii przyrostowych
+if [ "$BACKUP_LEVEL" = "0" ]; then
+    mv -f "$STATE_DIR/run.snar" "$STATE_DIR/level0.snar"
+    echo "$NAME" > "$STATE_DIR/level0.name"
+elif [ "$BACKUP_LEVEL" = "1" ]; then
+    rm -f "$STATE_DIR/run.snar"
+fi
+
+# Przeniesienie gotowego archiwum pod nazwę docelową
+mv -f "$PART" "$FINAL"
 chmod 600 "$FINAL"
 chown -R backup_user:backup_user "$FILES_DIR"
 
+ARCHIVE_BYTES=$(stat -c %s "$FINAL")
+
 # Czyszczenie katalogu roboczego
-rm -rf "$TASK_DIR"
+cleanup_workdir
+
+END_NS=$(date +%s%N)
+DURATION_MS=$(( (END_NS - START_NS) / 1000000 ))
+
+# Szczytowe użycie dysku: dane wyjściowe zadania + archiwum (brak plików pośrednich)
+PEAK_DISK_BYTES=$(( STAGING_BYTES + ARCHIVE_BYTES ))
 
-log "INFO" "Encrypted archive ready: $FINAL" "run_backup"
-echo $(basename "$ENC")
+log "INFO" "Encrypted archive ready: $FINAL (${DURATION_MS} ms, ${ARCHIVE_BYTES} B)" "run_backup"
+echo "STATS duration_ms=${DURATION_MS} staging_bytes=${STAGING_BYTES} archive_bytes=${ARCHIVE_BYTES} peak_disk_bytes=${PEAK_DISK_BYTES} compressor=${COMPRESSOR} level=${LEVEL} sha256=${CHECKSUM}${BACKUP_LEVEL:+ backup_level=${BACKUP_LEVEL}}" >&2
+echo "$NAME"
 exit 0
 EOF
 
@@ -379,6 +513,10 @@ mkdir -p "\$OUT_DIR"
 # Wszystkie pliki wyjściowe MUSZĄ być zapisywane wyłącznie w:
 #   \$OUT_DIR
 #
+# W trybie przyrostowym \$OUT_DIR NIE jest czyszczony między uruchomieniami -
+# aktualizuj go z zachowaniem czasów modyfikacji, np.:
+#   rsync -a --delete /var/www/html/ "\$OUT_DIR/www/"
+#
 # Jeśli pozostawisz tą sekcję niezmienioną, zadanie zakończy się błędem.
 echo "BŁĄD: Polecenia zadania kopii zapasowej nie zostały skonfigurowane dla zadania: $TASK" >&2
 exit 99
@@ -416,6 +554,7 @@ log() {
 
 SCRIPTS_DIR="/srv/backup_scripts"
 TMP_BASE="/srv/backup_tmp"
+STATE_BASE="/srv/backup_state"
 
 if [[ $# -ne 1 ]]; then
     echo "Użycie: $0 <task>" >&2
@@ -426,6 +565,7 @@ fi
 TASK="$1"
 FILE="${SCRIPTS_DIR}/${TASK}.sh"
 TMP_PATH="${TMP_BASE}/${TASK}"
+STATE_PATH="${STATE_BASE}/${TASK}"
 
 log "INFO" "delete_task invoked for task=$TASK" "delete_task"
 
@@ -454,6 +594,12 @@ if [[ -d "$TMP_PATH" ]]; then
     log "INFO" "Removed temp dir $TMP_PATH" "delete_task"
 fi
 
+# Usuwanie migawek kopii przyrostowych (jeśli istnieją)
+if [[ -d "$STATE_PATH" ]]; then
+    rm -rf "$STATE_PATH"
+    log "INFO" "Removed snapshot state $STATE_PATH" "delete_task"
+fi
+
 log "INFO" "Deleted task $TASK (file + tmp)" "delete_task"
 echo "OK"
 EOF
@@ -476,6 +622,7 @@ BACKUP_HOME="/home/${BACKUP_USER}"
 SCRIPTS_DIR="/srv/backup_scripts"
 FILES_DIR="/srv/backup_files"
 TMP_DIR="/srv/backup_tmp"
+STATE_DIR="/srv/backup_state"
 
 EXECUTOR="/usr/local/sbin/run_backup.sh"
 ADD_TASK_HELPER="/usr/local/sbin/add_task.sh"
@@ -514,7 +661,7 @@ else
 fi
 
 # Usuwanie skryptów, pliki kopii zapasowych i katalogi tymczasowe
-if rm -rf "$SCRIPTS_DIR" "$FILES_DIR" "$TMP_DIR" 2>/dev/null; then
+if rm -rf "$SCRIPTS_DIR" "$FILES_DIR" "$TMP_DIR" "$STATE_DIR" 2>/dev/null; then
     log "INFO" "Removed scripts, backup files, and tmp directories" "uninstall"
 else
     log "WARN" "Failed to remove directories" "uninstall"
@@ -705,6 +852,31 @@ fi
 # Sprawdzenie czy gpg jest zainstalowane i import klucza publicznego administratora
 install_gnupg_if_needed
 
+# Opcjonalne kompresory wielowątkowe (pigz, zstd) - ich brak nie przerywa instalacji
+for pkg in pigz zstd; do
+    if ! command -v "$pkg" >/dev/null 2>&1; then
+        if command -v apt-get >/dev/null 2>&1; then
+            apt-get install -y "$pkg" >/dev/null 2>&1 || true
+        elif command -v dnf >/dev/null 2>&1; then
+            dnf install -y "$pkg" >/dev/null 2>&1 || true
+        elif command -v yum >/dev/null 2>&1; then
+            yum install -y "$pkg" >/dev/null 2>&1 || true
+        elif command -v apk >/dev/null 2>&1; then
+            apk add --no-cache "$pkg" >/dev/null 2>&1 || true
+        elif command -v pacman >/dev/null 2>&1; then
+            pacman -Sy --noconfirm "$pkg" >/dev/null 2>&1 || true
+        fi
+    fi
+
+    if command -v "$pkg" >/dev/null 2>&1; then
+        echo "[INFO] $pkg jest dostępny"
+        log "INFO" "$pkg available" "install"
+    else
+        echo "[WARN] $pkg niedostępny — zadania z tym kompresorem użyją gzip"
+        log "WARN" "$pkg not available, using gzip fallback" "install"
+    fi
+done
+
 if [[ -z "${ADMIN_GPG_PUB:-}" ]]; then
   echo "[WARN] Nie podano publicznego klucza GPG. System został zainstalowany, ale szyfrowanie nie będzie działać dopóki klucz nie zostanie zaimportowany."
   log "WARN" "No GPG public key provided. Encryption will not work until key is imported." "install"
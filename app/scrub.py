@@ -0,0 +1,203 @@
+"""Okresowa weryfikacja integralności przechowywanych kopii (scrubbing).
+
+Każde uruchomienie sprawdza pliki najdawniej weryfikowane (najpierw nigdy
+niesprawdzone), więc kolejne uruchomienia wznawiają pracę tam, gdzie
+skończyło się poprzednie. Odczyt jest ograniczony do SCRUB_MAX_MBPS,
+a liczenie skrótów rozkładane na pulę procesów.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import or_, update
+
+from app.concurrency import get_redis
+from app.db import db
+from app.dedup import iter_file_chunks
+from app.models.backup_file import BackupFile
+from app.utils import log_event
+from app.stats import invalidate_dashboard_stats
+
+
+SCRUB_LAST_RUN_KEY = "scrub:last_run"
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_stream(chunks, rate, deadline=None):
+    """SHA-256 strumienia z ograniczeniem do `rate` bajtów/s (0 = bez limitu); zwraca (skrót, bajty).
+
+    Po przekroczeniu `deadline` (czas time.time(), wspólny dla procesów puli)
+    plik nie jest rozpoczynany i zamiast skrótu zwracane jest None. Rozpoczęty
+    plik jest liczony do końca - stanu SHA-256 nie da się zapisać między
+    uruchomieniami, a przerwanie oznaczałoby, że pliki większe niż budżet
+    jednego uruchomienia nigdy nie zostałyby sprawdzone.
+    """
+    if deadline is not None and time.time() >= deadline:
+        return None, 0
+
+    digest = hashlib.sha256()
+    total = 0
+    started = time.monotonic()
+    for chunk in chunks:
+        digest.update(chunk)
+        total += len(chunk)
+        if rate:
+            ahead = total / rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+    return digest.hexdigest(), total
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _hash_file(path, rate, deadline=None):
+    """Wywoływane w procesie puli - tylko odczyt pliku, bez dostępu do bazy."""
+    try:
+        checksum, size = _hash_stream(_read_file(path), rate, deadline)
+        return checksum, size, None
+    except OSError as e:
+        return None, 0, str(e)
+
+
+def _make_executor(workers):
+    # Proces demona (np. worker prefork Celery) nie może tworzyć procesów potomnych;
+    # hashlib zwalnia GIL dla dużych bloków, więc wątki również rozkładają pracę na rdzenie
+    if current_app.config.get("SCRUB_USE_PROCESSES", True) and not multiprocessing.current_process().daemon:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def scrub_backups():
+    """Weryfikuje sumy SHA-256 przechowywanych plików w granicach czasu i przepustowości."""
+    config = current_app.config
+    workers = max(config.get("SCRUB_WORKERS", 2), 1)
+    max_rate = config.get("SCRUB_MAX_MBPS", 50) * 1024 * 1024
+    run_seconds = config.get("SCRUB_RUN_SECONDS", 600)
+    reverify_before = (
+        datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=config.get("SCRUB_REVERIFY_DAYS", 30))
+    )
+
+    started = time.monotonic()
+    deadline = time.time() + run_seconds
+    checked = 0
+    checked_bytes = 0
+    failures = []
+
+    with _make_executor(workers) as executor:
+        while time.time() < deadline:
+            # NULL (pliki nigdy niesprawdzone) jest sortowany jako pierwszy w MySQL i SQLite
+            batch = (
+                db.session.query(
+                    BackupFile.id, BackupFile.name, BackupFile.path, BackupFile.checksum,
+                    BackupFile.deduplicated, BackupFile.task_id
+                )
+                .filter(
+                    BackupFile.deleted == False,
+                    or_(BackupFile.last_verified_at.is_(None), BackupFile.last_verified_at < reverify_before)
+                )
+                .order_by(BackupFile.last_verified_at, BackupFile.id)
+                .limit(workers * 4)
+                .all()
+            )
+            if not batch:
+                break
+
+            plain = [row for row in batch if not row.deduplicated]
+            # Pliki z magazynu deduplikacji są odtwarzane w bieżącym procesie równolegle z pulą,
+            # więc ich strumień też dostaje część limitu SCRUB_MAX_MBPS
+            streams = workers + (len(plain) < len(batch))
+            worker_rate = max_rate // streams if max_rate else 0
+            futures = [executor.submit(_hash_file, row.path, worker_rate, deadline) for row in plain]
+
+            results = []
+            # Pliki z magazynu deduplikacji są odtwarzane w bieżącym procesie (wymagają bazy);
+            # sprawdzone pliki dostają nowy last_verified_at, więc nie wracają w kolejnej partii
+            for row in batch:
+                if row.deduplicated:
+                    try:
+                        checksum, size = _hash_stream(iter_file_chunks(row), worker_rate, deadline)
+                        results.append((row, checksum, size, None))
+                    except Exception as e:
+                        results.append((row, None, 0, str(e)))
+            for row, future in zip(plain, futures):
+                results.append((row, *future.result()))
+
+            # Błąd odczytu może wynikać z usunięcia pliku przez czyszczenie w trakcie weryfikacji;
+            # nowy odczyt flagi deleted (po zakończeniu transakcji partii) pomija takie pliki
+            db.session.rollback()
+            suspect = [
+                row.id for row, checksum, size, error in results
+                if error is not None or (checksum is not None and checksum != row.checksum)
+            ]
+            deleted_meanwhile = {
+                file_id for (file_id,) in
+                db.session.query(BackupFile.id).filter(BackupFile.id.in_(suspect), BackupFile.deleted == True)
+            } if suspect else set()
+
+            verified_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            updates = []
+            for row, checksum, size, error in results:
+                checked_bytes += size
+                # Plik nierozpoczęty przed upływem SCRUB_RUN_SECONDS - last_verified_at bez zmian,
+                # zostanie sprawdzony w kolejnym uruchomieniu
+                if (checksum is None and error is None) or row.id in deleted_meanwhile:
+                    continue
+                checked += 1
+                failed = error is not None or checksum != row.checksum
+                updates.append({"id": row.id, "last_verified_at": verified_at, "verify_failed": failed})
+                if failed:
+                    failures.append(row.id)
+                    if error and not row.deduplicated and not os.path.exists(row.path):
+                        error = f"brak pliku {row.path}"
+                    log_event(
+                        f"Weryfikacja integralności pliku {row.name} nie powiodła się: "
+                        f"{error or 'niezgodna suma kontrolna'}.",
+                        type="błąd",
+                        task_id=row.task_id
+                    )
+
+            if updates:
+                db.session.execute(update(BackupFile), updates)
+            db.session.commit()
+
+    duration = time.monotonic() - started
+    summary = {
+        "files": checked,
+        "bytes": checked_bytes,
+        "failed": len(failures),
+        "seconds": round(duration, 1),
+        "mbps": round(checked_bytes / (1024 * 1024) / duration, 2) if duration > 0 else 0.0,
+        "finished_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    if not checked:
+        return summary
+
+    # Kokpit pokazuje ostatni przebieg, który faktycznie coś sprawdził
+    try:
+        get_redis().set(SCRUB_LAST_RUN_KEY, json.dumps(summary))
+    except Exception:
+        current_app.logger.warning("Nie udało się zapisać podsumowania weryfikacji w Redis.")
+    invalidate_dashboard_stats()
+
+    return summary
+
+
+def get_last_scrub_run():
+    try:
+        cached = get_redis().get(SCRUB_LAST_RUN_KEY)
+    except Exception:
+        return None
+    return json.loads(cached) if cached else None
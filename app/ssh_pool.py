@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+
+import paramiko
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class _PooledConnection:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+
+    def is_alive(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """Pula trwałych połączeń SSH w obrębie jednego procesu (workera).
+
+    Połączenia są kluczowane krotką (hostname, port, username), utrzymywane
+    przy życiu przez keepalive, usuwane po przekroczeniu czasu bezczynności
+    i odtwarzane automatycznie, gdy transport zostanie zerwany.
+    """
+
+    def __init__(self, max_per_host=4, idle_timeout=300, keepalive_interval=30):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._idle = {}
+        self._in_use = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "reconnects": 0,
+            "evictions": 0,
+            "handshakes": 0,
+            "handshake_seconds_total": 0.0,
+            "handshake_seconds_max": 0.0,
+        }
+
+    def _check_fork(self):
+        # Po forku (prefork Celery, gunicorn) gniazda rodzica nie mogą być współdzielone
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _evict_idle(self, now):
+        for key, conns in self._idle.items():
+            fresh = []
+            for conn in conns:
+                if now - conn.last_used > self.idle_timeout or not conn.is_alive():
+                    conn.close()
+                    self._stats["evictions"] += 1
+                else:
+                    fresh.append(conn)
+            self._idle[key] = fresh
+
+    def _connect(self, hostname, port, username, pkey, timeout):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        started = time.monotonic()
+        client.connect(
+            hostname=hostname,
+            port=port,
+            username=username,
+            pkey=pkey,
+            timeout=timeout,
+            banner_timeout=timeout,
+            auth_timeout=timeout,
+            allow_agent=False,
+            look_for_keys=False
+        )
+        elapsed = time.monotonic() - started
+
+        transport = client.get_transport()
+        if transport is not None and self.keepalive_interval:
+            transport.set_keepalive(self.keepalive_interval)
+
+        with self._lock:
+            self._stats["handshakes"] += 1
+            self._stats["handshake_seconds_total"] += elapsed
+            self._stats["handshake_seconds_max"] = max(self._stats["handshake_seconds_max"], elapsed)
+
+        return _PooledConnection(client)
+
+    def acquire(self, hostname, port, username, pkey, timeout=60):
+        key = (hostname, int(port), username)
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            self._check_fork()
+            while True:
+                self._evict_idle(time.monotonic())
+
+                idle = self._idle.get(key)
+                if idle:
+                    conn = idle.pop()
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    self._stats["hits"] += 1
+                    return key, conn
+
+                total = self._in_use.get(key, 0)
+                if total < self.max_per_host:
+                    self._in_use[key] = total + 1
+                    self._stats["misses"] += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"Przekroczono limit połączeń SSH do {hostname}:{port}")
+                self._lock.wait(remaining)
+
+        try:
+            return key, self._connect(hostname, port, username, pkey, timeout)
+        except Exception:
+            self._release_slot(key)
+            raise
+
+    def _release_slot(self, key):
+        with self._lock:
+            self._in_use[key] = max(self._in_use.get(key, 1) - 1, 0)
+            self._lock.notify()
+
+    def release(self, key, conn, discard=False):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._in_use[key] = max(self._in_use.get(key, 1) - 1, 0)
+            if discard or not conn.is_alive():
+                conn.close()
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.setdefault(key, []).append(conn)
+            self._lock.notify()
+
+    def exec_command(self, hostname, port, username, pkey, cmd, timeout=60, command_timeout=None, deadline=None):
+        """Wykonuje polecenie na połączeniu z puli, z jednokrotnym ponowieniem
+        na świeżym połączeniu, jeśli połączenie z puli okazało się martwe.
+
+        timeout dotyczy nawiązania połączenia; command_timeout (opcjonalny)
+        ogranicza czas oczekiwania na każdy odczyt wyniku. deadline (opcjonalny,
+        wartość time.monotonic()) ogranicza łączny czas polecenia - po jego
+        upływie kanał jest zamykany i zgłaszany jest CommandTimeout."""
+        for attempt in range(2):
+            key, conn = self.acquire(hostname, port, username, pkey, timeout)
+            try:
+                stdin, stdout, stderr = conn.client.exec_command(cmd, timeout=command_timeout)
+            except (paramiko.SSHException, EOFError, OSError):
+                self.release(key, conn, discard=True)
+                if attempt == 0:
+                    with self._lock:
+                        self._stats["reconnects"] += 1
+                    continue
+                raise
+
+            expired = threading.Event()
+            timer = None
+            if deadline is not None:
+                def expire(channel=stdout.channel):
+                    expired.set()
+                    channel.close()
+
+                timer = threading.Timer(max(deadline - time.monotonic(), 0), expire)
+                timer.daemon = True
+                timer.start()
+
+            try:
+                output = stdout.read()
+                error_output = stderr.read()
+                exit_status = stdout.channel.recv_exit_status()
+            except Exception:
+                self.release(key, conn, discard=True)
+                if expired.is_set():
+                    raise CommandTimeout("Przekroczono limit czasu polecenia")
+                raise
+            finally:
+                if timer:
+                    timer.cancel()
+
+            if expired.is_set():
+                self.release(key, conn, discard=True)
+                raise CommandTimeout("Przekroczono limit czasu polecenia")
+
+            self.release(key, conn)
+            return output, error_output, exit_status
+
+    def close_all(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle = {}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle_connections"] = sum(len(c) for c in self._idle.values())
+            stats["active_connections"] = sum(self._in_use.values())
+            stats["hosts"] = len({k for k, v in self._idle.items() if v} | {k for k, v in self._in_use.items() if v})
+
+        requests = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / requests, 4) if requests else 0.0
+        stats["handshake_seconds_avg"] = (
+            round(stats["handshake_seconds_total"] / stats["handshakes"], 4) if stats["handshakes"] else 0.0
+        )
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ssh_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from app.config import Config
+                _pool = SSHConnectionPool(
+                    max_per_host=Config.SSH_POOL_MAX_PER_HOST,
+                    idle_timeout=Config.SSH_POOL_IDLE_TIMEOUT,
+                    keepalive_interval=Config.SSH_KEEPALIVE_INTERVAL
+                )
+    return _pool
@@ -0,0 +1,107 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app.concurrency import get_redis
+from app.db import db
+from app.models.server import Server
+from app.models.backup_task import BackupTask
+from app.models.backup_file import BackupFile
+from app.models.event import Event
+
+
+DASHBOARD_STATS_KEY = "dashboard:stats"
+
+
+def compute_dashboard_stats():
+    """Liczniki kokpitu jednym zapytaniem z podzapytaniami skalarnymi oraz ostatnie błędy."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    day_ago = now - timedelta(days=1)
+    reverify_before = now - timedelta(days=current_app.config.get("SCRUB_REVERIFY_DAYS", 30))
+
+    counts = db.session.execute(select(
+        select(func.count(Server.id)).where(Server.deleted == False).scalar_subquery(),
+        select(func.count(BackupTask.id)).where(BackupTask.deleted == False).scalar_subquery(),
+        select(func.count(BackupTask.id))
+        .where(BackupTask.deleted == False, BackupTask.last_status == "błąd").scalar_subquery(),
+        select(func.count(BackupFile.id)).where(BackupFile.deleted == False).scalar_subquery(),
+        select(func.coalesce(func.sum(BackupFile.size), 0))
+        .where(BackupFile.deleted == False).scalar_subquery(),
+        select(func.count(BackupFile.id)).where(BackupFile.creation_time >= day_ago).scalar_subquery(),
+        select(func.count(BackupFile.id))
+        .where(BackupFile.deleted == False, BackupFile.last_verified_at >= reverify_before).scalar_subquery(),
+        select(func.count(BackupFile.id))
+        .where(BackupFile.deleted == False, BackupFile.verify_failed == True).scalar_subquery()
+    )).one()
+
+    last_errors = (
+        db.session.query(Event.timestamp, Event.details, BackupTask.name, Server.name)
+        .outerjoin(Event.task)
+        .outerjoin(Event.server)
+        .filter(Event.type == "błąd")
+        .order_by(Event.timestamp.desc())
+        .limit(5)
+        .all()
+    )
+
+    active_servers = (
+        db.session.query(Server.id, Server.name, Server.max_concurrent_backups)
+        .filter(Server.deleted == False, Server.status == "aktywny")
+        .all()
+    )
+
+    return {
+        "server_count": counts[0],
+        "task_count": counts[1],
+        "fails_count": counts[2],
+        "file_count": counts[3],
+        "stored_bytes": int(counts[4]),
+        "backups_24h": counts[5],
+        "verified_count": counts[6],
+        "verify_failed_count": counts[7],
+        "last_errors": [
+            {
+                "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                "details": details,
+                "task_name": task_name,
+                "server_name": server_name
+            }
+            for timestamp, details, task_name, server_name in last_errors
+        ],
+        "active_servers": [
+            {"id": server_id, "name": name, "max_concurrent_backups": max_concurrent}
+            for server_id, name, max_concurrent in active_servers
+        ]
+    }
+
+
+def get_dashboard_stats():
+    """Statystyki kokpitu z cache w Redis (wspólnego dla procesów web i workerów Celery)."""
+    ttl = current_app.config.get("DASHBOARD_CACHE_TTL", 30)
+    if ttl <= 0:
+        return compute_dashboard_stats()
+
+    try:
+        cached = get_redis().get(DASHBOARD_STATS_KEY)
+        if cached:
+            return json.loads(cached)
+    except Exception:
+        current_app.logger.warning("Cache statystyk kokpitu niedostępny, liczenie bezpośrednio.")
+        return compute_dashboard_stats()
+
+    stats = compute_dashboard_stats()
+    try:
+        get_redis().setex(DASHBOARD_STATS_KEY, ttl, json.dumps(stats))
+    except Exception:
+        pass
+    return stats
+
+
+def invalidate_dashboard_stats():
+    """Unieważnia cache kokpitu po zmianie zadań, plików, serwerów lub nowym błędzie."""
+    try:
+        get_redis().delete(DASHBOARD_STATS_KEY)
+    except Exception:
+        pass
@@ -1,11 +1,26 @@
 from app.celery_app import celery, flask_app
 from app.models.backup_task import BackupTask
 from app.models.backup_file import BackupFile
-from croniter import croniter
+from app.models.backup_run import BackupRun
 from datetime import datetime, timedelta, timezone
-from app.utils import execute_ssh_command, rsync_download_file, log_event
+from app.utils import execute_ssh_command, rsync_download_file, log_event, parse_backup_stats
+from app.ssh_pool import get_ssh_pool
+from app.concurrency import acquire_backup_slot, release_backup_slot
+from app.stats import invalidate_dashboard_stats
+from app.dedup import release_file_chunks
+from app.health import check_servers
+from app.bulk import run_remote_operations
+from app.scrub import scrub_backups
+from app.metrics import (
+    BACKUP_RUN_SECONDS, BACKUP_QUEUE_WAIT_SECONDS, BACKUP_REMOTE_SECONDS, BACKUP_ARCHIVE_BYTES, BACKUP_RETRIES
+)
+from celery.exceptions import Ignore
 from app.db import db
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update
+from sqlalchemy.orm import aliased
 from app.config import Config
 from flask_mail import Message
 from app import mail
@@ -14,23 +29,76 @@ from app.models.settings import Settings
 @celery.task
 def check_scheduled_backups():
     with flask_app.app_context():
-        now = datetime.now(timezone.utc)
-        tasks = BackupTask.query.filter_by(deleted=False).all()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        grace = Config.SCHEDULER_MISFIRE_GRACE_TIME
+
+        # Zadania bez wyliczonego terminu (np. sprzed migracji) - inicjalizacja
+        for task in BackupTask.query.filter(
+            BackupTask.deleted == False,
+            BackupTask.next_run_at.is_(None)
+        ).all():
+            task.schedule_next_run(now)
+
+        due_tasks = (
+            BackupTask.query
+            .filter(
+                BackupTask.deleted == False,
+                BackupTask.next_run_at <= now
+            )
+            .order_by(BackupTask.next_run_at)
+            .limit(Config.SCHEDULER_BATCH_SIZE)
+            .all()
+        )
+
+        to_run = []
+        for task in due_tasks:
+            missed_by = (now - task.next_run_at).total_seconds()
+
+            # Zaległe terminy są łączone w jedno uruchomienie; po przekroczeniu
+            # okna tolerancji (jeśli ustawione) uruchomienie jest pomijane
+            if grace and missed_by > grace:
+                log_event(
+                    f"Pominięto zaległe uruchomienie z {task.next_run_at.strftime('%Y-%m-%d %H:%M:%S')} "
+                    f"(opóźnienie {int(missed_by)} s).",
+                    type="informacja",
+                    task_id=task.id,
+                    server_id=task.server_id
+                )
+            else:
+                to_run.append(task.id)
+
+            task.schedule_next_run(now)
+
+        db.session.commit()
 
-        for task in tasks:
-            if not task.schedule:
-                continue
+        for task_id in to_run:
+            run_backup_task_celery.delay(task_id, enqueued_at=time.time())
 
-            cron = croniter(task.schedule, now)
-            prev_time = cron.get_prev(datetime)
+        return len(to_run)
 
-            if 0 <= (now - prev_time).total_seconds() < 60:
-                run_backup_task_celery.delay(task.id)
+
+RUN_STATUSES = {"success": "sukces", "retry": "ponowienie", "error": "błąd"}
+
+
+def finish_backup_run(run, result, attempt_started):
+    """Zamyka przebieg kopii; błąd zapisu nie może przesłonić wyniku zadania."""
+    try:
+        # Wyjątek w trakcie zadania mógł zostawić sesję w stanie wymagającym wycofania
+        if not db.session.is_active:
+            db.session.rollback()
+        run.finished_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        run.duration_ms = int((time.monotonic() - attempt_started) * 1000)
+        run.status = RUN_STATUSES.get(result, "błąd")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        flask_app.logger.exception("Nie udało się zapisać przebiegu kopii %s.", run.id)
 
 
 @celery.task(bind=True, max_retries=3)
-def run_backup_task_celery(self, task_id):
+def run_backup_task_celery(self, task_id, enqueued_at=None):
     with flask_app.app_context():
+        attempt_started = time.monotonic()
 
         task = BackupTask.query.get(task_id)
         if not task:
@@ -42,10 +110,11 @@ def run_backup_task_celery(self, task_id):
             return {"success": False, "message": "Nie znaleziono zadania."}
 
         server = task.server
-        task_name = task.name
+        outcome = {"result": "error"}
 
         def schedule_retry(error_message):
 
+            run.error = error_message
             current_retry = self.request.retries
             max_retry = self.max_retries
 
@@ -57,8 +126,10 @@ def run_backup_task_celery(self, task_id):
             )
 
             if current_retry >= max_retry:
+                outcome["result"] = "error"
                 task.last_status = "błąd"
                 db.session.commit()
+                invalidate_dashboard_stats()
 
                 log_event(
                     f"Błąd po 3 próbach ponowienia: {error_message}",
@@ -72,6 +143,8 @@ def run_backup_task_celery(self, task_id):
 
             retry_intervals = [60, 300, 600]
             delay = retry_intervals[current_retry]
+            outcome["result"] = "retry"
+            BACKUP_RETRIES.labels(server.name, task.name).inc()
 
             raise self.retry(
                 exc=Exception(error_message),
@@ -79,87 +152,318 @@ def run_backup_task_celery(self, task_id):
             )
 
 
-        success, output, error_output, exit_status = execute_ssh_command(
-            server,
-            f"run_backup {task_name}",
-            timeout=900
+        # Limit współbieżności: zadanie ponad limit wraca do kolejki bez zużywania prób
+        slot_token = self.request.id or f"local-{task.id}"
+        if not acquire_backup_slot(
+            server.id,
+            slot_token,
+            server.max_concurrent_backups,
+            Config.BACKUP_GLOBAL_CONCURRENCY,
+            Config.BACKUP_SLOT_TTL
+        ):
+            self.signature_from_request(
+                countdown=Config.BACKUP_HOLD_DELAY,
+                retries=self.request.retries
+            ).apply_async()
+            raise Ignore()
+
+        # Oczekiwanie w kolejce (łącznie z odroczeniami przez limity) mierzone dla pierwszej próby
+        if enqueued_at and not self.request.retries:
+            BACKUP_QUEUE_WAIT_SECONDS.labels(server.name, task.name).observe(max(time.time() - enqueued_at, 0))
+
+        # Przebieg jest zapisywany od razu, więc przerwana próba zostaje widoczna jako "w toku"
+        run = BackupRun(
+            task_id=task.id,
+            server_id=server.id,
+            attempt=self.request.retries,
+            queue_wait_ms=(
+                int(max(time.time() - enqueued_at, 0) * 1000)
+                if enqueued_at and not self.request.retries else None
+            )
         )
+        db.session.add(run)
+        db.session.commit()
 
-        if not success:
-            return schedule_retry(
-                f"Błąd wykonania kopii zapasowej."
+        try:
+            parent = task.incremental_parent()
+
+            remote_started = time.monotonic()
+            success, output, error_output, exit_status = execute_ssh_command(
+                server,
+                task.backup_command(parent),
+                timeout=900
             )
+            run.remote_ms = int((time.monotonic() - remote_started) * 1000)
+            run.exit_code = exit_status
 
-        if not output:
-            return schedule_retry(
-                "Nie znaleziono pliku kopii zapasowej."
+            if not success:
+                return schedule_retry(
+                    f"Błąd wykonania kopii zapasowej."
+                )
+
+            if not output:
+                return schedule_retry(
+                    "Nie znaleziono pliku kopii zapasowej."
+                )
+
+            stats = parse_backup_stats(error_output)
+
+            # Klient wykonuje kopię pełną, gdy nie ma migawki wskazanej kopii pełnej
+            level = stats.get("backup_level", 0) if task.incremental else 0
+            parent_id = parent.id if parent and level == 1 else None
+            run.level = level
+            run.staging_bytes = stats.get("staging_bytes")
+
+            if stats:
+                BACKUP_REMOTE_SECONDS.labels(server.name, task.name).observe(stats.get("duration_ms", 0) / 1000)
+                BACKUP_ARCHIVE_BYTES.labels(server.name, task.name).inc(stats.get("archive_bytes", 0))
+
+                kind = ""
+                if task.incremental:
+                    kind = f"kopia przyrostowa względem {parent.name}, " if parent_id else "kopia pełna, "
+                log_event(
+                    f"Archiwum utworzone na serwerze w {stats.get('duration_ms', 0) / 1000:.1f} s "
+                    f"({kind}"
+                    f"kompresja: {stats.get('compressor')} -{stats.get('level')}, "
+                    f"dane: {stats.get('staging_bytes', 0) / (1024*1024):.2f} MB, "
+                    f"archiwum: {stats.get('archive_bytes', 0) / (1024*1024):.2f} MB, "
+                    f"szczytowe użycie dysku: {stats.get('peak_disk_bytes', 0) / (1024*1024):.2f} MB).",
+                    type="informacja",
+                    task_id=task.id,
+                    server_id=server.id
+                )
+
+
+            local_path = Config.BACKUP_FOLDER
+
+            success, out, err, code = rsync_download_file(
+                task_id=task.id,
+                server=server,
+                remote_path=output,
+                local_path=local_path,
+                expected_checksum=stats.get("sha256"),
+                level=level,
+                parent_id=parent_id,
+                run=run
             )
 
+            if success:
+                log_event(
+                    f"Pomyślnie pobrano plik kopii zapasowej: {output}.",
+                    type="informacja",
+                    task_id=task.id,
+                    server_id=server.id
+                )
 
-        local_path = Config.BACKUP_FOLDER
 
-        success, out, err, code = rsync_download_file(
-            task_id=task.id,
-            server=server,
-            remote_path=output,
-            local_path=local_path
-        )
+            if not success:
+                return schedule_retry(
+                    f"Błąd pobierania pliku: {output}"
+                )
+
+
+            task.last_status = "sukces"
+            outcome["result"] = "success"
+            db.session.commit()
+            invalidate_dashboard_stats()
 
-        if success:
             log_event(
-                f"Pomyślnie pobrano plik kopii zapasowej: {output}.",
+                "Kopia zapasowa wykonana poprawnie",
                 type="informacja",
                 task_id=task.id,
                 server_id=server.id
             )
 
-
-        if not success:
-            return schedule_retry(
-                f"Błąd pobierania pliku: {output}"
+            return {
+                "success": True,
+                "message": f"Pobrano plik kopii zapasowej: {output}",
+                "remote_path": output
+            }
+
+        finally:
+            release_backup_slot(server.id, slot_token)
+            finish_backup_run(run, outcome["result"], attempt_started)
+            BACKUP_RUN_SECONDS.labels(server.name, task.name, outcome["result"]).observe(
+                time.monotonic() - attempt_started
             )
 
 
-        task.last_status = "sukces"
-        db.session.commit()
+def _remove_backup_file(path):
+    """Usuwa plik kopii; zwraca (czy oznaczyć jako usunięty, komunikat błędu)."""
+    try:
+        os.remove(path)
+        return True, None
+    except FileNotFoundError:
+        return True, None
+    except OSError as e:
+        return False, f"{path}: {e}"
+
+
+@celery.task
+def cleanup_old_backups():
+    with flask_app.app_context():
+        started = time.monotonic()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        batch_size = Config.CLEANUP_BATCH_SIZE
+
+        removed_count = 0
+        freed_bytes = 0
+        errors = []
+
+        # Jedna granica czasu na każdą wartość retencji - wygasłe pliki wybierane w SQL
+        retentions = [
+            row[0] for row in
+            db.session.query(BackupTask.retention).distinct().all()
+        ]
+
+        # Pełna kopia z aktywnymi kopiami przyrostowymi jest zachowywana do czasu ich usunięcia,
+        # aby nie przerwać łańcucha odtwarzania
+        child = aliased(BackupFile)
+        has_active_children = (
+            db.session.query(child.id)
+            .filter(child.parent_id == BackupFile.id, child.deleted == False)
+            .exists()
+        )
+
+        with ThreadPoolExecutor(max_workers=Config.CLEANUP_UNLINK_WORKERS) as executor:
+            for retention in retentions:
+                cutoff = now - timedelta(days=retention)
+                last_id = 0
+
+                while True:
+                    batch = (
+                        db.session.query(BackupFile.id, BackupFile.path, BackupFile.size, BackupFile.deduplicated)
+                        .join(BackupTask, BackupTask.id == BackupFile.task_id)
+                        .filter(
+                            BackupTask.retention == retention,
+                            BackupFile.deleted == False,
+                            BackupFile.creation_time < cutoff,
+                            BackupFile.id > last_id,
+                            ~has_active_children
+                        )
+                        .order_by(BackupFile.id)
+                        .limit(batch_size)
+                        .all()
+                    )
+                    if not batch:
+                        break
+                    last_id = batch[-1].id
+
+                    # Pliki w magazynie deduplikacji nie mają własnej kopii na dysku
+                    dedup_ids = [row.id for row in batch if row.deduplicated]
+                    plain = [row for row in batch if not row.deduplicated]
+                    results = executor.map(_remove_backup_file, [row.path for row in plain])
+
+                    deleted_ids = list(dedup_ids)
+                    for row, (removed, error) in zip(plain, results):
+                        if removed:
+                            deleted_ids.append(row.id)
+                            freed_bytes += row.size
+                        else:
+                            # Plik zostaje aktywny i zostanie ponowiony przy kolejnym czyszczeniu
+                            errors.append(error)
+
+                    if deleted_ids:
+                        db.session.execute(
+                            update(BackupFile)
+                            .where(BackupFile.id.in_(deleted_ids))
+                            .values(deleted=True)
+                        )
+                    db.session.commit()
+                    removed_count += len(deleted_ids)
+
+                    # Fragmenty są usuwane dopiero, gdy nie odwołuje się do nich żaden plik
+                    _, chunk_bytes = release_file_chunks(dedup_ids)
+                    freed_bytes += chunk_bytes
+
+        duration = time.monotonic() - started
+        summary = (
+            f"Czyszczenie starych kopii: usunięto {removed_count} plików, "
+            f"zwolniono {freed_bytes / (1024*1024):.2f} MB w {duration:.1f} s"
+        )
+        if errors:
+            summary += f"; nie udało się usunąć {len(errors)} plików (pierwszy błąd: {errors[0]})"
+        print(summary)
 
         log_event(
-            "Kopia zapasowa wykonana poprawnie",
-            type="informacja",
-            task_id=task.id,
-            server_id=server.id
+            summary + ".",
+            type="błąd" if errors else "informacja"
         )
 
+        if removed_count:
+            invalidate_dashboard_stats()
+
+        return {"removed": removed_count, "freed_bytes": freed_bytes, "errors": len(errors)}
+
+
+@celery.task
+def check_servers_health():
+    with flask_app.app_context():
+        results = check_servers()
         return {
-            "success": True,
-            "message": f"Pobrano plik kopii zapasowej: {output}",
-            "remote_path": output
+            "checked": len(results),
+            "active": sum(1 for result in results if result["success"])
         }
 
 
 @celery.task
-def cleanup_old_backups():
-    now = datetime.now(timezone.utc)
-
-    files = BackupFile.query.filter_by(deleted=False).all()
-
-    for file in files:
-        retention_days = file.task.retention
-        if file.creation_time + timedelta(days=retention_days) < now:
-            if os.path.exists(file.path):
-                try:
-                    os.remove(file.path)
-                    print(f"Usunięto plik kopii zapasowej: {file.path}")
-                except Exception as e:
-                    print(f"Błąd przy usuwaniu pliku {file.path}.")
+def scrub_stored_backups():
+    with flask_app.app_context():
+        summary = scrub_backups()
+        if summary["files"]:
+            log_event(
+                f"Weryfikacja integralności: sprawdzono {summary['files']} plików "
+                f"({summary['bytes'] / (1024*1024):.2f} MB, {summary['mbps']:.2f} MB/s), "
+                f"błędy: {summary['failed']}.",
+                type="informacja"
+            )
+        return summary
+
+
+@celery.task(bind=True)
+def bulk_remote_operations(self, operations):
+    """Polecenia zdalne dla wielu hostów (np. deinstalacja przy usuwaniu serwerów)
+    z postępem odczytywanym przez /jobs/<id>."""
+    with flask_app.app_context():
+        total = len(operations)
+
+        def progress(done, failed):
+            self.update_state(state="PROGRESS", meta={"total": total, "done": done, "failed": failed})
+
+        progress(0, 0)
+        results = run_remote_operations(operations, progress)
+
+        for result in results:
+            if result["success"]:
+                log_event(
+                    f"{result['label']}: wykonano na {result['hostname']} w {result['duration_ms'] / 1000:.1f} s.",
+                    type="informacja",
+                    server_id=result["server_id"],
+                    task_id=result["task_id"]
+                )
             else:
-                print(f"Plik {file.path} nie istnieje, pominięto.")
+                log_event(
+                    f"{result['label']}: błąd na {result['hostname']}: {result['error'] or 'brak szczegółów'}",
+                    type="błąd",
+                    server_id=result["server_id"],
+                    task_id=result["task_id"]
+                )
 
-            file.mark_deleted()
-            db.session.add(file)
+        return {
+            "total": total,
+            "done": len(results),
+            "failed": sum(1 for result in results if not result["success"]),
+            "errors": [
+                {"hostname": result["hostname"], "label": result["label"], "error": result["error"]}
+                for result in results if not result["success"]
+            ]
+        }
+
+
+@celery.task
+def ssh_pool_stats():
+    return get_ssh_pool().stats()
 
-    db.session.commit()
-    
 
 @celery.task(bind=True)
 def send_email(self, subject: str, body: str, recipient: str = None):
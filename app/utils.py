@@ -1,4 +1,4 @@
-from flask import current_app, request
+from flask import current_app, request, g
 from app.models.settings import Settings
 import paramiko, io
 from app.models.backup_task import BackupTask
@@ -6,12 +6,24 @@ from app.models.backup_file import BackupFile
 from app.models.server import Server
 import tempfile
 import os
+import atexit
+import shutil
+import threading
 import subprocess
 import hashlib
+import json
+import socket
+import time
 from datetime import datetime, timezone
-from app.db import db
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from app.db import db, release_db_connection
 from app.models.event import Event
 import string, secrets
+from app.ssh_pool import get_ssh_pool
+from app.stats import invalidate_dashboard_stats
+from app.concurrency import get_redis
+from app.dedup import ingest_backup_file
+from app.metrics import SSH_COMMAND_SECONDS, RSYNC_TRANSFER_SECONDS, RSYNC_TRANSFERRED_BYTES, CHECKSUM_SECONDS, EVENTS_LOGGED
 
 def generate_code(length=6):
     return ''.join(secrets.choice(string.digits) for _ in range(length))
@@ -38,40 +50,49 @@ def load_install_script():
 def execute_ssh_command(server, cmd, username="backup_user", timeout=60):
 
     private_key = get_private_key_for_paramiko()
+    command = cmd.split(" ", 1)[0]
+    # Zdarzenia zebrane przed długim poleceniem nie mogą czekać w pamięci na jego koniec
+    flush_events()
+    release_db_connection()
+    started = time.monotonic()
 
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-    
     try:
-        ssh.connect(
-            hostname=server.hostname,
-            port=server.port,
-            username=username,
-            pkey=private_key,
+        output, error_output, exit_status = get_ssh_pool().exec_command(
+            server.hostname,
+            server.port,
+            username,
+            private_key,
+            cmd,
             timeout=timeout
         )
 
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-
-        output = stdout.read().decode(errors="replace").strip()
-        error_output = stderr.read().decode(errors="replace").strip()
-        exit_status = stdout.channel.recv_exit_status()
-
-        ssh.close()
+        output = output.decode(errors="replace").strip()
+        error_output = error_output.decode(errors="replace").strip()
 
+        SSH_COMMAND_SECONDS.labels(server.name, command, "ok" if exit_status == 0 else "error").observe(
+            time.monotonic() - started
+        )
         return (exit_status == 0, output, error_output, exit_status)
 
     except Exception as e:
+        SSH_COMMAND_SECONDS.labels(server.name, command, "error").observe(time.monotonic() - started)
         return (False, str(e), "", -1)
-    
-    
+
+
+_paramiko_key_cache = {}
+
 def get_private_key_for_paramiko():
 
     try:
         settings = Settings.query.first()
         if settings and settings.command_private_key_ssh:
-            return paramiko.Ed25519Key.from_private_key(io.StringIO(settings.command_private_key_ssh))
+            key_hash = hashlib.sha256(settings.command_private_key_ssh.encode()).hexdigest()
+            private_key = _paramiko_key_cache.get(key_hash)
+            if private_key is None:
+                private_key = paramiko.Ed25519Key.from_private_key(io.StringIO(settings.command_private_key_ssh))
+                _paramiko_key_cache.clear()
+                _paramiko_key_cache[key_hash] = private_key
+            return private_key
         else:
             return None
     except Exception as e:
@@ -80,49 +101,173 @@ def get_private_key_for_paramiko():
 def get_private_key_for_rsync():
     settings = Settings.query.first()
     return settings.rsync_private_key_ssh if settings else None
-    
-def rsync_download_file(task_id, server, remote_path, local_path, username="backup_user"):
+
+
+_rsync_key_lock = threading.Lock()
+_rsync_key_state = {"pid": None, "dir": None, "path": None, "hash": None, "checked": 0.0}
+
+
+def _remove_rsync_key_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def remove_rsync_key_dir():
+    """Usuwa katalog klucza rsync bieżącego procesu.
+
+    Procesy potomne prefork Celery kończą się przez os._exit, z pominięciem
+    atexit - dla nich wywoływane z sygnału worker_process_shutdown.
+    """
+    with _rsync_key_lock:
+        state = _rsync_key_state
+        if state["pid"] == os.getpid() and state["dir"]:
+            _remove_rsync_key_dir(state["dir"])
+            state.update(dir=None, path=None, hash=None, checked=0.0)
+
+
+def get_rsync_key_dir():
+    """Prywatny katalog procesu (0700, tmpfs gdy dostępny) na klucz rsync i gniazda ControlMaster."""
+    with _rsync_key_lock:
+        state = _rsync_key_state
+        # Po forku proces potomny tworzy własny katalog - nie współdzieli pliku klucza z rodzicem
+        if state["pid"] != os.getpid() or not state["dir"] or not os.path.isdir(state["dir"]):
+            base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+            state.update(
+                pid=os.getpid(),
+                dir=tempfile.mkdtemp(prefix="backup_rsync_", dir=base),
+                path=None,
+                hash=None,
+                checked=0.0
+            )
+            atexit.register(_remove_rsync_key_dir, state["dir"])
+        return state["dir"]
+
+
+def get_rsync_key_path():
+    """Ścieżka pliku klucza prywatnego rsync (0600) zapisanego raz na proces.
+
+    Klucz z ustawień jest odczytywany ponownie co RSYNC_KEY_CACHE_TTL sekund,
+    a plik nadpisywany tylko, gdy zmienił się jego skrót.
+    """
+    key_dir = get_rsync_key_dir()
+    now = time.monotonic()
+    state = _rsync_key_state
+
+    with _rsync_key_lock:
+        if state["path"] and state["checked"] > now and os.path.exists(state["path"]):
+            return state["path"]
+
     private_key_str = get_private_key_for_rsync()
     if not private_key_str:
+        return None
+    key_hash = hashlib.sha256(private_key_str.encode()).hexdigest()
+
+    with _rsync_key_lock:
+        if state["hash"] != key_hash or not state["path"] or not os.path.exists(state["path"]):
+            path = os.path.join(key_dir, "rsync_key")
+            tmp_path = f"{path}.{threading.get_ident()}"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as key_file:
+                key_file.write(private_key_str)
+            os.replace(tmp_path, path)
+            state.update(path=path, hash=key_hash)
+
+        state["checked"] = now + current_app.config.get("RSYNC_KEY_CACHE_TTL", 60)
+        return state["path"]
+
+
+def rsync_ssh_options():
+    """Opcje ssh współdzielenia połączenia (ControlMaster) - kolejne transfery do hosta
+    używają jednego uwierzytelnionego połączenia utrzymywanego przez RSYNC_CONTROL_PERSIST sekund."""
+    persist = current_app.config.get("RSYNC_CONTROL_PERSIST", 60)
+    if persist <= 0:
+        return []
+    return [
+        "-o", "ControlMaster=auto",
+        "-o", f"ControlPersist={persist}",
+        # %C - skrót z hosta, portu i użytkownika; krótka ścieżka mieści się w limicie gniazda
+        "-o", f"ControlPath={os.path.join(get_rsync_key_dir(), 'cm-%C')}"
+    ]
+
+
+def compute_file_checksum(path, buffer_size=1024 * 1024):
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+        sha256_hash = hashlib.sha256()
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            sha256_hash.update(view[:n])
+        return sha256_hash.hexdigest()
+
+
+def rsync_download_file(task_id, server, remote_path, local_path, username="backup_user", expected_checksum=None,
+                        level=0, parent_id=None, run=None):
+    try:
+        key_path = get_rsync_key_path()
+    except OSError as e:
+        return False, "", f"Błąd zapisu klucza prywatnego: {e}", -1
+    if not key_path:
         return False, "", "Brak klucza prywatnego w ustawieniach", -1
 
-    key_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, mode="w", prefix="ssh_key_", suffix=".pem") as key_file:
-            key_path = key_file.name
-
-        os.chmod(key_path, 0o600)
-
-        with open(key_path, "w") as key_file:
-            key_file.write(private_key_str)
-
         remote = f"{username}@{server.hostname}:{remote_path}"
+        ssh_cmd = " ".join(
+            ["ssh", "-T", "-i", key_path, "-p", str(server.port), "-o", "StrictHostKeyChecking=no"]
+            + server.ssh_transport_options()
+            + rsync_ssh_options()
+        )
         cmd = [
             "rsync",
-            "-avz",
+            *server.rsync_options(),
             "--remove-source-files",
-            "-e", f"ssh -T -i {key_path} -p {server.port} -o StrictHostKeyChecking=no",
+            "-e", ssh_cmd,
             remote,
             local_path
         ]
 
+        task = BackupTask.query.get(task_id)
+        task_label = task.name if task else str(task_id)
+
+        flush_events()
+        started = time.monotonic()
         result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        elapsed = time.monotonic() - started
         success = result.returncode == 0
         stdout = result.stdout.decode(errors="replace")
         stderr = result.stderr.decode(errors="replace")
+        RSYNC_TRANSFER_SECONDS.labels(server.name, task_label, "ok" if success else "error").observe(elapsed)
+        if run:
+            run.transfer_ms = int(elapsed * 1000)
 
         file_path = f"{local_path}/{remote_path}"
         if success:
             if os.path.exists(file_path):
                 size = os.path.getsize(file_path)
+                RSYNC_TRANSFERRED_BYTES.labels(server.name, task_label).inc(size)
+                if run:
+                    run.archive_bytes = size
                 creation_time = datetime.fromtimestamp(os.path.getctime(file_path),tz=timezone.utc)
-                sha256_hash = hashlib.sha256()
-                with open(file_path, "rb") as f:
-                    for byte_block in iter(lambda: f.read(4096), b""):
-                        sha256_hash.update(byte_block)
-                checksum = sha256_hash.hexdigest()
 
-                task = BackupTask.query.get(task_id)
+                # rsync weryfikuje plik własną sumą po transferze, więc suma zgłoszona
+                # przez serwer wystarcza; lokalne liczenie tylko gdy jej brak lub gdy wymuszone
+                if expected_checksum and not current_app.config.get("VERIFY_LOCAL_CHECKSUM"):
+                    checksum = expected_checksum
+                else:
+                    hash_started = time.monotonic()
+                    checksum = compute_file_checksum(file_path)
+                    hash_elapsed = time.monotonic() - hash_started
+                    CHECKSUM_SECONDS.labels(task_label).observe(hash_elapsed)
+                    if run:
+                        run.hash_ms = int(hash_elapsed * 1000)
+                    if expected_checksum and checksum != expected_checksum:
+                        os.remove(file_path)
+                        return False, stdout, f"Niezgodna suma kontrolna pliku {os.path.basename(file_path)}", -1
+
                 if task:
                     backup_file = BackupFile(
                         task_id=task.id,
@@ -130,41 +275,283 @@ def rsync_download_file(task_id, server, remote_path, local_path, username="back
                         size=size,
                         path=file_path,
                         creation_time=creation_time,
-                        checksum=checksum
+                        checksum=checksum,
+                        level=level,
+                        parent_id=parent_id
                     )
                     db.session.add(backup_file)
+                    if run:
+                        run.backup_file = backup_file
                     db.session.commit()
+                    invalidate_dashboard_stats()
+
+                size_mb = size / (1024 * 1024)
+                throughput = size_mb / elapsed if elapsed > 0 else 0.0
+                log_event(
+                    f"Transfer pliku {os.path.basename(file_path)}: {size_mb:.2f} MB w {elapsed:.1f} s "
+                    f"({throughput:.2f} MB/s).",
+                    type="informacja",
+                    task_id=task_id,
+                    server_id=server.id
+                )
+
+                if task and task.dedup:
+                    error = store_deduplicated(backup_file, server)
+                    if error:
+                        if run:
+                            run.backup_file = None
+                            db.session.commit()
+                        return False, stdout, error, -1
 
         return success, stdout, stderr, result.returncode
 
     except Exception as e:
+        db.session.rollback()
         return False, "", f"Błąd: {e}", -1
 
-    finally:
-        if key_path and os.path.exists(key_path):
-            os.remove(key_path)
+
+def parse_backup_stats(error_output):
+    """Odczytuje linię `STATS klucz=wartość ...` wypisaną przez run_backup.sh na stderr."""
+    stats = {}
+    for line in (error_output or "").splitlines():
+        if line.startswith("STATS "):
+            for pair in line[len("STATS "):].split():
+                key, _, value = pair.partition("=")
+                stats[key] = int(value) if value.isdigit() and key != "sha256" else value
+    return stats
+
+
+EVENT_LOOKUP_VERSION_KEY = "event_lookup:version"
+
+_notification_cache = {"expires": 0.0, "value": None, "version": None}
+_name_cache = {}
+
+
+def _cached(key, loader):
+    """Prosty cache z czasem życia EVENT_LOOKUP_CACHE_TTL dla odczytów przy logowaniu błędów."""
+    now = time.monotonic()
+    entry = _name_cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    value = loader()
+    _name_cache[key] = (now + current_app.config.get("EVENT_LOOKUP_CACHE_TTL", 60), value)
+    return value
+
+
+def _sync_event_lookup_cache():
+    """Czyści cache procesu, gdy inny proces podbił wersję w Redis (np. web po zmianie ustawień).
+
+    Przy niedostępnym Redis wpisy wygasają po EVENT_LOOKUP_CACHE_TTL.
+    """
+    try:
+        version = get_redis().get(EVENT_LOOKUP_VERSION_KEY)
+    except Exception:
+        return
+    if version != _notification_cache["version"]:
+        _notification_cache["version"] = version
+        _notification_cache["expires"] = 0.0
+        _name_cache.clear()
+
+
+def get_notification_recipient():
+    _sync_event_lookup_cache()
+    now = time.monotonic()
+    if _notification_cache["expires"] <= now:
+        settings = Settings.query.first()
+        if settings and settings.are_notifications_enabled and settings.email_address:
+            _notification_cache["value"] = settings.email_address
+        else:
+            _notification_cache["value"] = None
+        _notification_cache["expires"] = now + current_app.config.get("EVENT_LOOKUP_CACHE_TTL", 60)
+    return _notification_cache["value"]
+
+
+def invalidate_event_lookup_cache():
+    """Unieważnia cache odbiorcy powiadomień i nazw we wszystkich procesach web i workerach Celery."""
+    _notification_cache["expires"] = 0.0
+    _name_cache.clear()
+    try:
+        get_redis().incr(EVENT_LOOKUP_VERSION_KEY)
+    except Exception:
+        current_app.logger.warning("Nie udało się unieważnić cache powiadomień w Redis.")
+
+
+_spool_lock = threading.Lock()
+
+
+def _spool_events(rows):
+    """Dopisuje zdarzenia do pliku procesu w EVENT_SPOOL_FOLDER - zapisywane w bazie przy kolejnym zapisie."""
+    path = os.path.join(
+        current_app.config.get("EVENT_SPOOL_FOLDER"),
+        f"events_{socket.gethostname()}_{os.getpid()}.jsonl"
+    )
+    try:
+        with _spool_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a") as f:
+                for row in rows:
+                    f.write(json.dumps({**row, "timestamp": row["timestamp"].isoformat()}) + "\n")
+    except OSError:
+        current_app.logger.exception("Nie udało się zapisać %d zdarzeń: %s", len(rows), rows)
+
+
+def _store_events(rows):
+    """Zapisuje zdarzenia wsadowo; po błędzie ponawia pojedynczo, a przy niedostępnej bazie odkłada do pliku.
+
+    Zwraca True, gdy zapis wsadowy się powiódł.
+    """
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(Event.__table__.insert(), rows)
+        return True
+    except Exception:
+        current_app.logger.exception("Zapis wsadowy %d zdarzeń nie powiódł się, zapis pojedynczo.", len(rows))
+
+    for i, row in enumerate(rows):
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(Event.__table__.insert(), [row])
+        except (OperationalError, PoolTimeoutError):
+            _spool_events(rows[i:])
+            return False
+        except Exception:
+            # Błędne dane zdarzenia - ponowienie nic nie zmieni
+            current_app.logger.exception("Odrzucono zdarzenie: %s", row)
+    return False
+
+
+def _replay_spooled_events():
+    """Zapisuje w bazie zdarzenia odłożone do plików (także przez inne procesy na wspólnym wolumenie)."""
+    folder = current_app.config.get("EVENT_SPOOL_FOLDER")
+    try:
+        names = [name for name in os.listdir(folder) if name.endswith(".jsonl")]
+    except OSError:
+        return
+
+    for name in names:
+        path = os.path.join(folder, name)
+        claimed = f"{path}.{socket.gethostname()}_{os.getpid()}_{threading.get_ident()}"
+        try:
+            # Plik właśnie uzupełniany przez swój proces jest pomijany
+            if time.time() - os.path.getmtime(path) < 5:
+                continue
+            # Zmiana nazwy przejmuje plik - inne procesy go nie odczytają
+            os.rename(path, claimed)
+            with open(claimed) as f:
+                lines = f.read().splitlines()
+            os.remove(claimed)
+        except OSError:
+            continue
+
+        rows = []
+        for line in lines:
+            try:
+                row = json.loads(line)
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+                rows.append(row)
+            except (ValueError, KeyError, TypeError):
+                current_app.logger.error("Uszkodzony wpis w pliku zdarzeń %s: %s", name, line)
+        if rows:
+            _store_events(rows)
+            current_app.logger.info("Zapisano %d zdarzeń odłożonych do pliku %s.", len(rows), name)
+
+
+def flush_events(exc=None):
+    """Zapisuje zbuforowane zdarzenia jednym wsadowym INSERT-em.
+
+    Wywoływane przy zamykaniu kontekstu aplikacji (koniec żądania lub zadania
+    Celery, także po wyjątku), po przekroczeniu progu rozmiaru/wieku bufora
+    oraz przed długimi operacjami zdalnymi (polecenie SSH, transfer rsync).
+    Zapis odbywa się na osobnym połączeniu, więc nie zatwierdza zmian
+    oczekujących w sesji żądania. Zdarzenia, których nie udało się zapisać
+    przy niedostępnej bazie, trafiają do EVENT_SPOOL_FOLDER i są zapisywane
+    po pierwszym udanym zapisie.
+    """
+    buffer = g.pop("event_buffer", None)
+    g.pop("event_buffer_started", None)
+    if not buffer:
+        return
+
+    if _store_events(buffer):
+        _replay_spooled_events()
+
+    if any(event["type"] == "błąd" for event in buffer):
+        invalidate_dashboard_stats()
+
+
+def store_deduplicated(backup_file, server):
+    """Przenosi pobrany plik do magazynu deduplikacji; zwraca opis błędu albo None.
+
+    Plik w trybie deduplikacji nie jest zaszyfrowany GPG, więc po nieudanym
+    przyjęciu do magazynu jest usuwany z dysku, a kopia oznaczana jako usunięta.
+    """
+    try:
+        result = ingest_backup_file(backup_file)
+    except Exception as e:
+        db.session.rollback()
+        try:
+            os.remove(backup_file.path)
+        except FileNotFoundError:
+            pass
+        backup_file.deleted = True
+        db.session.commit()
+        invalidate_dashboard_stats()
+
+        log_event(
+            f"Błąd deduplikacji pliku {backup_file.name}: {e}. Niezaszyfrowany plik został usunięty.",
+            type="błąd",
+            task_id=backup_file.task_id,
+            server_id=server.id
+        )
+        return f"Błąd deduplikacji pliku {backup_file.name}: {e}"
+
+    logical_mb = result["logical_bytes"] / (1024 * 1024)
+    stored_mb = result["stored_bytes"] / (1024 * 1024)
+    ratio = result["logical_bytes"] / result["stored_bytes"] if result["stored_bytes"] else float("inf")
+    throughput = logical_mb / result["seconds"] if result["seconds"] > 0 else 0.0
+    log_event(
+        f"Deduplikacja pliku {backup_file.name}: {logical_mb:.2f} MB, nowe dane {stored_mb:.2f} MB "
+        f"(współczynnik {ratio:.1f}x), {throughput:.2f} MB/s.",
+        type="informacja",
+        task_id=backup_file.task_id,
+        server_id=server.id
+    )
+    return None
 
 
 def log_event(details: str, type: str = "informacja", server_id: int = None, task_id: int = None):
     timestamp = datetime.now(timezone.utc)
+    EVENTS_LOGGED.labels(type).inc()
 
-    event = Event(
-        type=type,
-        details=details,
-        timestamp=timestamp,
-        server_id=server_id,
-        task_id=task_id
-    )
-    db.session.add(event)
-    db.session.commit()
+    if "event_buffer" not in g:
+        g.event_buffer = []
+        g.event_buffer_started = time.monotonic()
+
+    g.event_buffer.append({
+        "type": type,
+        "details": details,
+        "timestamp": timestamp,
+        "server_id": server_id,
+        "task_id": task_id
+    })
+
+    if (len(g.event_buffer) >= current_app.config.get("EVENT_BUFFER_SIZE", 50)
+            or time.monotonic() - g.event_buffer_started >= current_app.config.get("EVENT_BUFFER_MAX_AGE", 5)):
+        flush_events()
 
     if type == "błąd":
-        settings = Settings.query.first()
+        recipient = get_notification_recipient()
 
-        if settings and settings.are_notifications_enabled and settings.email_address:
+        if recipient:
             from app.tasks_celery import send_email
-            server_name = Server.query.with_entities(Server.name).filter_by(id=server_id).scalar()
-            task_name = BackupTask.query.with_entities(BackupTask.name).filter_by(id=task_id).scalar()
+            server_name = _cached(
+                ("server", server_id),
+                lambda: Server.query.with_entities(Server.name).filter_by(id=server_id).scalar()
+            ) if server_id else None
+            task_name = _cached(
+                ("task", task_id),
+                lambda: BackupTask.query.with_entities(BackupTask.name).filter_by(id=task_id).scalar()
+            ) if task_id else None
             
             subject=f"Błąd - {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
             body = f"""
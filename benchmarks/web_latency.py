@@ -0,0 +1,138 @@
+"""Test obciążeniowy: opóźnienie interfejsu przy wielu trwających poleceniach SSH.
+
+Najpierw mierzy czas odpowiedzi lekkiej strony (domyślnie lista serwerów) bez
+obciążenia, a następnie ponownie, gdy --concurrency klientów bez przerwy
+wywołuje test połączenia z serwerami --server-ids. Przy workerach gthread
+lub gevent mediana i p95 w obu fazach powinny być zbliżone; w trybie sync
+strona czeka, aż zwolni się worker zajęty przez SSH.
+
+Opcja --tarpit PORT uruchamia lokalny port, który przyjmuje połączenia i nigdy
+nie odpowiada - serwer dodany w aplikacji jako 127.0.0.1:PORT symuluje
+zawieszony host (każdy test połączenia trwa HEALTH_CHECK_TIMEOUT).
+
+Użycie:
+    python -m benchmarks.web_latency --url http://127.0.0.1:8000 --password haslo \\
+        --server-ids 1 2 3 --concurrency 50 --tarpit 2222
+"""
+import argparse
+import socket
+import statistics
+import threading
+import time
+
+import requests
+
+
+def start_tarpit(port):
+    """Przyjmuje połączenia TCP i trzyma je otwarte bez wysłania bannera SSH."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", port))
+    listener.listen(1024)
+    held = []
+
+    def accept_loop():
+        while True:
+            conn, _ = listener.accept()
+            held.append(conn)
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return listener
+
+
+def login(url, username, password):
+    session = requests.Session()
+    response = session.post(f"{url}/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return session
+
+
+def probe(session, url, path, seconds, interval):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            if session.get(f"{url}{path}", timeout=60).status_code != 200:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append((time.monotonic() - started) * 1000)
+        time.sleep(interval)
+    return latencies, errors
+
+
+def ssh_load(cookies, url, server_ids, stop, counter, lock):
+    session = requests.Session()
+    session.cookies.update(cookies)
+    i = 0
+    while not stop.is_set():
+        server_id = server_ids[i % len(server_ids)]
+        i += 1
+        try:
+            session.post(f"{url}/servers/test-connection/{server_id}", timeout=120)
+        except requests.RequestException:
+            pass
+        with lock:
+            counter[0] += 1
+
+
+def summary(name, latencies, errors):
+    if not latencies:
+        print(f"{name:<12} brak pomiarów")
+        return
+    ordered = sorted(latencies)
+    p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    print(
+        f"{name:<12} żądania: {len(ordered):>5}  błędy: {errors:>3}  "
+        f"p50: {statistics.median(ordered):8.1f} ms  p95: {p95:8.1f} ms  maks.: {ordered[-1]:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--server-ids", type=int, nargs="+", required=True)
+    parser.add_argument("--concurrency", type=int, default=50, help="liczba równoległych testów połączenia")
+    parser.add_argument("--seconds", type=float, default=20, help="czas każdej fazy pomiaru")
+    parser.add_argument("--path", default="/servers/", help="mierzona strona interfejsu")
+    parser.add_argument("--interval", type=float, default=0.1, help="odstęp między pomiarami (s)")
+    parser.add_argument("--tarpit", type=int, metavar="PORT", help="lokalny port symulujący zawieszony host")
+    args = parser.parse_args()
+
+    if args.tarpit:
+        start_tarpit(args.tarpit)
+
+    url = args.url.rstrip("/")
+    session = login(url, args.username, args.password)
+
+    baseline = probe(session, url, args.path, args.seconds, args.interval)
+
+    stop = threading.Event()
+    counter, lock = [0], threading.Lock()
+    load_threads = [
+        threading.Thread(
+            target=ssh_load,
+            args=(session.cookies, url, args.server_ids, stop, counter, lock),
+            daemon=True
+        )
+        for _ in range(args.concurrency)
+    ]
+    for thread in load_threads:
+        thread.start()
+    # Chwila na zajęcie workerów przez polecenia SSH
+    time.sleep(1)
+    loaded = probe(session, url, args.path, args.seconds, args.interval)
+    stop.set()
+
+    print(f"Strona {args.path}, {args.concurrency} równoległych testów połączenia SSH")
+    summary("bez SSH", *baseline)
+    summary("z SSH", *loaded)
+    print(f"Zakończone testy połączenia w czasie pomiaru: {counter[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,19 +8,28 @@ until mysqladmin ping -h"${MYSQL_HOST}" -u"${MYSQL_USER}" -p"${MYSQL_PASSWORD}"
 done
 echo "MySQL is ready!"
 
+# Katalog metryk współdzielony przez procesy gunicorn i workery Celery
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    # Pliki poprzedniego uruchomienia tego kontenera - PID-y nowych procesów by się z nimi pokrywały
+    rm -f "$PROMETHEUS_MULTIPROC_DIR"/*_"${METRICS_INSTANCE:-$(hostname)}"_*.db
+fi
+
 if [ "$SERVICE" = "web" ]; then
     echo "Running DB migrations..."
     flask db upgrade
     echo "Seeding default admin (if not exists)..."
     python -m app.seed
-    echo "Starting Gunicorn..."
-    exec gunicorn -w 4 -b 0.0.0.0:8000 run:app --log-level info
+    echo "Starting Gunicorn (${WEB_WORKER_CLASS:-gthread} workers)..."
+    exec gunicorn -c gunicorn.conf.py run:app
 
 fi
 
 if [ "$SERVICE" = "celery_worker" ]; then
-    echo "Starting Celery Worker..."
-    exec celery -A app.celery_app.celery worker --loglevel=info
+    echo "Starting Celery Worker (queues: ${CELERY_QUEUES:-control,backups})..."
+    exec celery -A app.celery_app.celery worker --loglevel=info \
+        -Q "${CELERY_QUEUES:-control,backups}" \
+        ${CELERY_CONCURRENCY:+--concurrency "$CELERY_CONCURRENCY"}
 fi
 
 if [ "$SERVICE" = "celery_beat" ]; then
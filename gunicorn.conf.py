@@ -0,0 +1,29 @@
+"""Konfiguracja gunicorn dla usługi web, sterowana zmiennymi środowiskowymi.
+
+Trasy wykonujące polecenia SSH (test połączenia, dodawanie zadania) i pobieranie
+plików blokują obsługujący je wątek na czas operacji. W trybie synchronicznym
+(WEB_WORKER_CLASS=sync) kilka wolnych hostów zajmuje wszystkie workery, dlatego
+domyślnie każdy worker obsługuje WEB_THREADS żądań równolegle (gthread).
+Tryb gevent obsługuje do WEB_WORKER_CONNECTIONS żądań na worker - gniazda
+paramiko, PyMySQL i redis stają się kooperacyjne po monkey-patchingu,
+wykonywanym przez worker gevent przed załadowaniem aplikacji.
+"""
+import os
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_WORKERS", 4))
+threads = int(os.getenv("WEB_THREADS", 8))
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", 100))
+
+# Najdłuższe polecenie SSH w trasach ma limit 60 s
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+loglevel = "info"
+
+if worker_class not in ("sync", "gthread", "gevent"):
+    raise ValueError(f"Nieobsługiwany WEB_WORKER_CLASS: {worker_class} (dozwolone: sync, gthread, gevent)")